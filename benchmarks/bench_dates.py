@@ -0,0 +1,69 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Compare ``datetime.strptime`` with ``parsers._parse_datetime``.
+
+Usage::
+
+  $ python -m benchmarks.bench_dates
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+from datetime import timedelta
+import timeit
+
+from ribxlib import parsers
+
+NUMBER = 10000
+REPEAT = 5
+
+
+def strptime(datestr, timestr):
+    """How inspection dates were parsed before."""
+    if timestr:
+        return datetime.strptime(
+            '{} {}'.format(datestr, timestr), "%Y-%m-%d %H:%M:%S")
+    return datetime.strptime(datestr, "%Y-%m-%d")
+
+
+def uncached(datestr, timestr):
+    """The fast path alone, without memoization."""
+    parsers._datetime_cache.clear()
+    return parsers._parse_datetime(datestr, timestr)
+
+
+def samples(distinct):
+    """Return NUMBER (date, time) pairs with this many distinct ones."""
+    start = datetime(2017, 1, 1, 8, 0, 0)
+    values = [start + timedelta(days=i // 24, hours=i % 24)
+              for i in range(distinct)]
+    return [(value.strftime("%Y-%m-%d"), value.strftime("%H:%M:%S"))
+            for value in (values * (NUMBER // distinct + 1))[:NUMBER]]
+
+
+def best(func, pairs):
+    def run():
+        for datestr, timestr in pairs:
+            func(datestr, timestr)
+    return min(timeit.repeat(run, number=1, repeat=REPEAT)) / len(pairs)
+
+
+def main():
+    for title, distinct, func in [
+            ("Few distinct dates", 5, parsers._parse_datetime),
+            ("All dates distinct", NUMBER, uncached),
+    ]:
+        pairs = samples(distinct)
+        old = best(strptime, pairs)
+        new = best(func, pairs)
+        print("%s: %.2f us -> %.2f us (%.1fx)" % (
+            title, old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == '__main__':
+    main()
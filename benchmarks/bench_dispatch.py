@@ -0,0 +1,73 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Compare five whole-document ``//ZB_x`` scans with single-pass dispatch.
+
+Usage::
+
+  $ python -m benchmarks.bench_dispatch [some-file.ribx]
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import timeit
+
+from lxml import etree
+
+from ribxlib import models
+from ribxlib import parsers
+
+DEFAULT_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'testdata', 'ribx_12',
+    'reiniging_leiding.ribx')
+
+REPEAT = 5
+
+
+def five_scans(tree):
+    """The node lookup as it was done before: one XPath scan per model."""
+    return [(model, node)
+            for model in models.MODELS.values()
+            for node in tree.xpath('//{}'.format(model.tag))]
+
+
+def single_pass(tree):
+    """The node lookup as it is done now: one pass over the root."""
+    return [(models.MODELS[node.tag], node)
+            for node in tree.getroot() if node.tag in models.MODELS]
+
+
+def parse_nodes(tree, lookup, mode):
+    error_log = []
+    return [parsers._parse_node(node, model, mode, error_log)
+            for model, node in lookup(tree)]
+
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT))
+
+
+def main():
+    f = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FILE
+    tree = etree.parse(f)
+    mode = parsers.Mode.INSPECTION
+
+    print("File: %s" % f)
+    for title, func in [
+            ("Node lookup", lambda lookup: lookup(tree)),
+            ("Lookup + element parsing",
+             lambda lookup: parse_nodes(tree, lookup, mode)),
+    ]:
+        old = best(lambda: func(five_scans))
+        new = best(lambda: func(single_pass))
+        print("%s: %.2f ms -> %.2f ms (%.1fx)" % (
+            title, old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Measure the memory that a parsed Ribx holds per element.
+
+The memory is measured with tracemalloc (Python 3) after parsing, once the
+document itself has been freed, so it is what a worker keeps for the
+elements.
+
+Usage::
+
+  $ python -m benchmarks.bench_memory [--elements 20000]
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import gc
+import io
+import tracemalloc
+
+from benchmarks.generator import Generator
+from ribxlib import parsers
+from ribxlib.parsers import Mode
+
+
+def document(mode, elements, media):
+    """Return a document with this many elements, 2/5 of them pipes."""
+    f = io.StringIO()
+    generator = Generator(mode=mode, observations=0, media=media)
+    generator.write(f, pipes=elements * 2 // 5, manholes=elements * 2 // 5,
+                    drains=elements // 5)
+    return f.getvalue().encode('utf-8')
+
+
+def retained(data, mode):
+    """Return (bytes, elements) that the parsed Ribx holds on to."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ribx, log = parsers.parse(io.BytesIO(data), mode)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, len(list(ribx.elements()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--elements', type=int, default=20000)
+    args = parser.parse_args()
+
+    for title, mode, media in [
+            ("PREINSPECTION", Mode.PREINSPECTION, False),
+            ("INSPECTION, no media", Mode.INSPECTION, False),
+            ("INSPECTION with video", Mode.INSPECTION, True),
+    ]:
+        data = document(mode, args.elements, media)
+        size, elements = retained(data, mode)
+        print("%s: %d bytes per element (%d elements)" % (
+            title, size / elements, elements))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Regression benchmark for parsing observation-heavy inspection pipes.
+
+Every ZC record must be turned into exactly one Observation, which is used
+for both the media set and the observations list of its pipe.
+
+Usage::
+
+  $ python -m benchmarks.bench_observations [pipes] [observations-per-pipe]
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import sys
+import timeit
+
+from benchmarks.generator import Generator
+from ribxlib import models
+from ribxlib import parsers
+
+REPEAT = 3
+
+
+def synthetic_ribx(pipes, observations):
+    """Return a RIBX document with observation-heavy inspection pipes."""
+    f = io.StringIO()
+    Generator(observations=observations).write(f, pipes=pipes)
+    return f.getvalue().encode('utf-8')
+
+
+class CountingObservation(models.Observation):
+    count = 0
+
+    def __init__(self, zc_node):
+        CountingObservation.count += 1
+        super(CountingObservation, self).__init__(zc_node)
+
+
+def main():
+    pipes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    observations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    data = synthetic_ribx(pipes, observations)
+    mode = parsers.Mode.INSPECTION
+
+    print("%d pipes with %d observations each (%.1f MB)" % (
+        pipes, observations, len(data) / 1e6))
+
+    seconds = min(timeit.repeat(
+        lambda: parsers.parse(io.BytesIO(data), mode),
+        number=1, repeat=REPEAT))
+    print("parse: %.3f s" % seconds)
+
+    original, models.Observation = models.Observation, CountingObservation
+    try:
+        ribx, error_log = parsers.parse(io.BytesIO(data), mode)
+    finally:
+        models.Observation = original
+    assert not error_log, error_log
+
+    per_record = CountingObservation.count / (pipes * observations)
+    print("Observations built per ZC record: %.2f" % per_record)
+    if per_record != 1:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Generate synthetic RIBX documents of any size.
+
+The documents contain inspection pipes (ZB_A), inspection manholes (ZB_C)
+and drains (ZB_E), optionally with ZC observations, media references and
+errors that the parser should report.
+
+Usage::
+
+  $ python -m benchmarks.generator --size 100MB --errors 0.01 out.ribx
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import random
+
+from ribxlib import models
+from ribxlib.parsers import Mode
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<DATA xmlns:gml="http://www.opengis.net/gml">
+  <ZA>
+    <A2>nl</A2>
+    <A6>RIBX 1.3</A6>
+  </ZA>
+"""
+
+FOOTER = "</DATA>\n"
+
+POINT = "<gml:Point><gml:pos>{:.2f} {:.2f}</gml:pos></gml:Point>"
+
+OBSERVATION_CODES = ['BAB', 'BAF', 'BBA', 'BBB', 'BCA', 'BDB', 'BXA']
+
+# Errors that can be injected: (tag suffix, value)
+ERRORS = [
+    ('XD', 'Q'),  # Unknown work impossible code
+    ('BF', '2015-13-45'),  # Invalid date
+    ('BS', 'C:\\videos\\video.mpg'),  # Folder name, only for has_video
+]
+
+UNITS = {'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+
+
+class Generator(object):
+    """Writes a synthetic RIBX document to a (text) file object.
+
+    Args:
+      mode (Enum): PREINSPECTION documents have no inspection dates, media
+        or observations.
+      observations (int): Number of ZC records per pipe, manhole or drain.
+      media (bool): Add video and photo references.
+      errors (float): Fraction of the records that contains an error.
+      seed (int): Seed for the random generator, for reproducible output.
+
+    """
+
+    def __init__(self, mode=Mode.INSPECTION, observations=10, media=True,
+                 errors=0.0, seed=0):
+        self.mode = mode
+        self.observations = observations
+        self.media = media
+        self.errors = errors
+        self.random = random.Random(seed)
+
+    def records(self, pipes, manholes, drains):
+        """Generate the records, interleaving the kinds of elements."""
+        counts = {'pipe': pipes, 'manhole': manholes, 'drain': drains}
+        total = pipes + manholes + drains
+        for i in range(total):
+            # Spread each kind evenly over the document
+            for kind in ('pipe', 'manhole', 'drain'):
+                if counts[kind] * (i + 1) // total > \
+                        counts[kind] * i // total:
+                    yield getattr(self, kind)(i)
+
+    def write(self, f, pipes=0, manholes=0, drains=0):
+        """Write a document with the given number of elements."""
+        f.write(HEADER)
+        for record in self.records(pipes, manholes, drains):
+            f.write(record)
+        f.write(FOOTER)
+
+    def write_size(self, f, size):
+        """Write a document of at least size bytes (approximately), with as
+        many pipes as manholes and a drain for every other pipe."""
+        written = len(HEADER) + len(FOOTER)
+        f.write(HEADER)
+        i = 0
+        while written < size:
+            for record in (self.pipe(i), self.manhole(i + 1),
+                           self.pipe(i + 2), self.manhole(i + 3),
+                           self.drain(i + 4)):
+                f.write(record)
+                written += len(record.encode('utf-8'))
+            i += 5
+        f.write(FOOTER)
+
+    def pipe(self, i):
+        fields = [
+            ('AAA', 'pipe{}'.format(i)),
+            ('AAB', 'manhole{}'.format(i)),
+            ('AAD', 'manhole{}'.format(i)),
+            ('AAE', POINT.format(*self.point(i))),
+            ('AAF', 'manhole{}'.format(i + 1)),
+            ('AAG', POINT.format(*self.point(i + 1))),
+            ('ABQ', '{:.2f}'.format(self.random.uniform(10, 100))),
+        ]
+        return self.record('ZB_A', fields, i)
+
+    def manhole(self, i):
+        fields = [
+            ('CAA', 'manhole{}'.format(i)),
+            ('CAB', POINT.format(*self.point(i))),
+        ]
+        return self.record('ZB_C', fields, i)
+
+    def drain(self, i):
+        fields = [
+            ('EAA', 'drain{}'.format(i)),
+            ('EAB', POINT.format(*self.point(i))),
+            ('EAQ', 'A'),
+        ]
+        return self.record('ZB_E', fields, i)
+
+    def point(self, i):
+        return 140000 + (i % 1000) * 10.0, 480000 + (i // 1000) * 10.0
+
+    def record(self, tag, fields, i):
+        prefix = tag[-1]
+        inspection = self.mode == Mode.INSPECTION
+        if inspection:
+            fields.append((prefix + 'BF', '2015-05-{:02d}'.format(
+                1 + i % 28)))
+            if self.media and tag != 'ZB_E':
+                fields.append((prefix + 'BS', '{}.mpg'.format(fields[0][1])))
+
+        if self.errors and self.random.random() < self.errors:
+            # ?BS is only checked for elements that can have video
+            suffix, value = self.random.choice(
+                ERRORS if models.MODELS[tag].has_video else
+                [error for error in ERRORS if error[0] != 'BS'])
+            fields = [(name, v) for (name, v) in fields
+                      if name != prefix + suffix]
+            fields.append((prefix + suffix, value))
+
+        lines = ['  <{}>'.format(tag)]
+        lines.extend('    <{0}>{1}</{0}>'.format(name, value)
+                     for name, value in fields)
+        if inspection:
+            for j in range(self.observations):
+                lines.append(self.observation(fields[0][1], j))
+        lines.append('  </{}>\n'.format(tag))
+        return '\n'.join(lines)
+
+    def observation(self, ref, j):
+        lines = [
+            '    <ZC>',
+            '      <A>{}</A>'.format(self.random.choice(OBSERVATION_CODES)),
+            '      <B>A</B>',
+            '      <I>{:.2f}</I>'.format(j * 0.5),
+        ]
+        if self.media:
+            lines.append('      <M>{}-{}.jpg</M>'.format(ref, j))
+        lines.append('    </ZC>')
+        return '\n'.join(lines)
+
+
+def parse_size(size):
+    """Return the number of bytes in '100MB' and the like."""
+    size = size.strip().upper()
+    for unit, factor in UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * factor)
+    return int(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('filename')
+    parser.add_argument('--size', default='1MB',
+                        help="approximate size, e.g. 500KB, 10MB or 1GB")
+    parser.add_argument('--mode', default='INSPECTION',
+                        choices=[mode.name for mode in Mode])
+    parser.add_argument('--observations', type=int, default=10,
+                        help="ZC records per element (default: 10)")
+    parser.add_argument('--no-media', action='store_true')
+    parser.add_argument('--errors', type=float, default=0.0,
+                        help="fraction of records with an error")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = Generator(
+        mode=Mode[args.mode], observations=args.observations,
+        media=not args.no_media, errors=args.errors, seed=args.seed)
+    with open(args.filename, 'w') as f:
+        generator.write_size(f, parse_size(args.size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Benchmark ribxlib on synthetic RIBX documents of increasing size.
+
+Each measurement runs in a fresh process, so that peak RSS is measured per
+benchmark. The results are saved as JSON; pass an earlier results file with
+``--compare`` to see the differences, e.g. between two versions.
+
+Usage::
+
+  $ python -m benchmarks.harness --sizes 1MB,10MB,100MB -o results.json
+  $ python -m benchmarks.harness --sizes 1MB,10MB,100MB --compare results.json
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generator import Generator
+from benchmarks.generator import parse_size
+from ribxlib.parsers import Mode
+
+DEFAULT_SIZES = '1MB,10MB,100MB,1GB'
+
+BENCHMARKS = ['parse', 'media', 'quick_scan', 'cli']
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes."""
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def measure(benchmark, filename, mode, allocations):
+    """Run one benchmark in this process, return a dict of measurements."""
+    from ribxlib import parsers
+    from ribxlib import script
+
+    if allocations:
+        import tracemalloc
+        tracemalloc.start()
+
+    result = {}
+    if benchmark == 'parse':
+        start = time.time()
+        ribx, error_log = parsers.parse(filename, mode)
+        result['seconds'] = time.time() - start
+        result['errors'] = len(error_log)
+    elif benchmark == 'media':
+        ribx, error_log = parsers.parse(filename, mode)
+        start = time.time()
+        result['media'] = len(ribx.media)
+        result['seconds'] = time.time() - start
+    elif benchmark == 'quick_scan':
+        start = time.time()
+        summary = parsers.quick_scan(filename)
+        result['seconds'] = time.time() - start
+        result['media'] = len(summary.media)
+    elif benchmark == 'cli':
+        sys.argv = ['ribxdebug', filename]
+        stdout = sys.stdout
+        sys.stdout = io.open(os.devnull, 'w')
+        start = time.time()
+        try:
+            script.main()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        result['seconds'] = time.time() - start
+    else:
+        raise ValueError("Unknown benchmark: {}".format(benchmark))
+
+    if allocations:
+        result['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result['peak_rss_bytes'] = peak_rss()
+    return result
+
+
+def run(benchmark, filename, mode, allocations):
+    """Run one benchmark in a fresh process. Allocations are traced in a
+    separate run, as tracing slows things down a lot."""
+    result = _run(benchmark, filename, mode, False)
+    if allocations:
+        traced = _run(benchmark, filename, mode, True)
+        result['peak_traced_bytes'] = traced['peak_traced_bytes']
+    return result
+
+
+def _run(benchmark, filename, mode, allocations):
+    command = [sys.executable, '-m', 'benchmarks.harness', '--measure',
+               benchmark, '--mode', mode.name, filename]
+    if allocations:
+        command.append('--allocations')
+    with open(os.devnull, 'w') as devnull:
+        output = subprocess.check_output(command, stderr=devnull)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def synthetic_file(directory, size, mode, args):
+    """Return the filename of a synthetic document, generating it if it
+    doesn't exist yet."""
+    filename = os.path.join(directory, 'synthetic-{}-{}-{}-{}.ribx'.format(
+        size, mode.name, args.observations, args.errors))
+    if not os.path.exists(filename):
+        generator = Generator(mode=mode, observations=args.observations,
+                              errors=args.errors)
+        with io.open(filename + '.tmp', 'w', encoding='utf-8') as f:
+            generator.write_size(f, parse_size(size))
+        os.rename(filename + '.tmp', filename)
+    return filename
+
+
+def compare(results, previous):
+    """Print the ratios of new to previous timings and peak RSS."""
+    old = dict(((r['size'], r['mode'], r['benchmark']), r)
+               for r in previous['results'])
+    print("Compared to %s (%s):" % (previous['version'],
+                                    previous['timestamp']))
+    for result in results:
+        key = (result['size'], result['mode'], result['benchmark'])
+        if key not in old:
+            continue
+        print("  %-6s %-13s %-10s time x%.2f, peak RSS x%.2f" % (
+            key + (result['seconds'] / old[key]['seconds'],
+                   result['peak_rss_bytes'] / old[key]['peak_rss_bytes'])))
+
+
+def version():
+    try:
+        from importlib import metadata
+        return metadata.version('ribxlib')
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help="comma separated (default: %(default)s)")
+    parser.add_argument('--modes', default='INSPECTION,PREINSPECTION')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS))
+    parser.add_argument('--observations', type=int, default=10)
+    parser.add_argument('--errors', type=float, default=0.0)
+    parser.add_argument('--allocations', action='store_true',
+                        help="also trace allocations (slow)")
+    parser.add_argument('--directory', default=tempfile.gettempdir(),
+                        help="where synthetic files are kept")
+    parser.add_argument('-o', '--output', help="JSON file for the results")
+    parser.add_argument('--compare', help="JSON file of an earlier run")
+    # Internal: run a single measurement in this process.
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('filename', nargs='?', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.filename,
+                                 Mode[args.mode], args.allocations)))
+        return
+
+    results = []
+    for size in args.sizes.split(','):
+        for mode in [Mode[name] for name in args.modes.split(',')]:
+            filename = synthetic_file(args.directory, size, mode, args)
+            for benchmark in args.benchmarks.split(','):
+                if benchmark == 'cli' and mode != Mode.INSPECTION:
+                    continue  # ribxdebug always uses inspection mode
+                result = run(benchmark, filename, mode, args.allocations)
+                result.update({
+                    'benchmark': benchmark,
+                    'size': size,
+                    'mode': mode.name,
+                    'file_bytes': os.path.getsize(filename),
+                })
+                print("%-6s %-13s %-10s %8.3f s  %7.1f MB peak RSS" % (
+                    size, mode.name, benchmark, result['seconds'],
+                    result['peak_rss_bytes'] / 1e6))
+                results.append(result)
+
+    report = {
+        'version': version(),
+        'python': platform.python_version(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
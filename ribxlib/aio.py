@@ -0,0 +1,130 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Parsing on an asyncio event loop (Python 3.7+).
+
+This is a separate module because of the syntax; ``parse_async`` is also
+available from ``ribxlib.parsers``.
+
+"""
+
+import asyncio
+import logging
+
+from lxml import etree
+
+from ribxlib import errors
+from ribxlib import models
+from ribxlib import parsers
+from ribxlib import sources
+
+logger = logging.getLogger(__name__)
+
+
+def parse_async(f, mode, error_log=None):
+    """Parse a GWSW.Ribx / GWSW.Ribx-A document without blocking the loop.
+
+    The document is fed to lxml's ``XMLPullParser`` in chunks, as they are
+    read. Each ZB_* record is parsed as soon as its end tag has been fed,
+    after which its subtree is cleared, and control goes back to the event
+    loop between records. The same checks as in ``parse`` are done.
+
+    Args:
+      f: Full path to the file to be parsed; a file object, whose read() may
+        be a coroutine (e.g. ``asyncio.StreamReader``); or an async iterable
+        of bytes, e.g. the chunks of an upload that is still arriving. Paths
+        and file objects with a plain read() may be compressed.
+      mode (Enum): See ribx.parsers.Mode.
+      error_log (ErrorLog): Optional ErrorLog to which parsing errors are
+        appended. A plain list gets dicts, and each error is logged.
+
+    Returns:
+      An AsyncParse. Await it for a (ribx, log) tuple like ``parse`` returns:
+      if the document isn't well formed, an empty Ribx and only the syntax
+      errors. Or use ``async for`` to get the elements one at a time; errors
+      are then appended to error_log, and the elements before a syntax
+      error are still generated.
+
+    """
+    return AsyncParse(f, mode, error_log)
+
+
+class AsyncParse(object):
+    """Awaitable and async iterable result of ``parse_async``."""
+
+    def __init__(self, f, mode, error_log=None):
+        self.f = f
+        self.mode = mode
+        self.error_log = (
+            errors.ErrorLog() if error_log is None else error_log)
+
+    def __await__(self):
+        return self._parse().__await__()
+
+    def __aiter__(self):
+        return self._elements(self.error_log, self.error_log)
+
+    async def _parse(self):
+        # The errors of the records are only added to error_log if there
+        # are no syntax errors, as with parse.
+        record_log = (errors.ErrorLog()
+                      if isinstance(self.error_log, errors.ErrorLog) else [])
+        syntax_log = []
+        ribx = models.Ribx()
+        async for instance in self._elements(record_log, syntax_log):
+            ribx.add(instance)
+        if syntax_log:
+            self.error_log.extend(syntax_log)
+            return models.Ribx(), self.error_log
+        self.error_log.extend(record_log)
+        return ribx, self.error_log
+
+    async def _elements(self, error_log, syntax_log):
+        """Generate the elements, appending the errors of the records to
+        error_log and syntax errors to syntax_log."""
+        parser = etree.XMLPullParser(
+            events=('end',), tag=list(models.MODELS))
+        strings = {}  # See parsers._intern
+        try:
+            async for chunk in _chunks(self.f):
+                parser.feed(chunk)
+                for instance in self._parse_events(parser, error_log, strings):
+                    yield instance
+                    await asyncio.sleep(0)
+            parser.close()
+            for instance in self._parse_events(parser, error_log, strings):
+                yield instance
+        except etree.XMLSyntaxError as e:
+            logger.error(e)
+            syntax_log.extend(parsers._log_entries(parser.feed_error_log))
+
+    def _parse_events(self, parser, error_log, strings):
+        for event, node in parser.read_events():
+            instance = parsers._parse_node(
+                node, models.MODELS[node.tag], self.mode, error_log,
+                strings=strings)
+            parsers._clear(node)
+            if instance:
+                yield instance
+
+
+async def _chunks(f):
+    """Generate the bytes of a path, file object or async iterable. Paths
+    and file objects with a plain read() may be gzip or zip compressed,
+    see ``ribxlib.sources``."""
+    if hasattr(f, 'read') and asyncio.iscoroutinefunction(f.read):
+        while True:
+            chunk = await f.read(sources.READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    elif hasattr(f, '__aiter__'):
+        async for chunk in f:
+            yield chunk
+    else:
+        with sources.open_stream(f) as stream:
+            while True:
+                chunk = stream.read(sources.READ_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+                await asyncio.sleep(0)
@@ -0,0 +1,107 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Columnar (NumPy) export of a parsed Ribx, for vectorized checks.
+
+NumPy is an optional dependency; it is only needed for this module.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+
+NAN = float('nan')
+MISSING_POINT = (NAN, NAN)
+
+COMMON_FIELDS = [
+    (str('inspection_date'), 'datetime64[s]'),
+    (str('work_impossible'), '?'),
+    (str('new'), '?'),
+    (str('sourceline'), 'i8'),  # -1 if unknown
+]
+
+PIPE_DTYPE = np.dtype([
+    (str('ref'), 'O'),
+    (str('start'), 'f8', (2,)),  # Coordinates of manhole1
+    (str('end'), 'f8', (2,)),  # Coordinates of manhole2
+    (str('expected_inspection_length'), 'f8'),
+    (str('segment_length'), 'f8'),
+] + COMMON_FIELDS)
+
+POINT_DTYPE = np.dtype([
+    (str('ref'), 'O'),
+    (str('point'), 'f8', (2,)),
+] + COMMON_FIELDS)
+
+OBSERVATION_DTYPE = np.dtype([
+    (str('parent'), 'i8'),  # Index in the inspection_pipes array
+    (str('code'), 'O'),
+    (str('distance'), 'f8'),
+])
+
+
+def _xy(geom):
+    if geom is None:
+        return MISSING_POINT
+    return geom.GetX(), geom.GetY()
+
+
+def _float(value):
+    return NAN if value is None else value
+
+
+def _common(element):
+    return (
+        element.inspection_date,
+        bool(element.work_impossible),
+        element.new,
+        -1 if element.sourceline is None else element.sourceline,
+    )
+
+
+def _pipe_row(pipe):
+    return (
+        pipe.ref,
+        _xy(pipe.manhole1.geom if pipe.manhole1 else None),
+        _xy(pipe.manhole2.geom if pipe.manhole2 else None),
+        _float(getattr(pipe, 'expected_inspection_length', None)),
+        _float(getattr(pipe, 'segment_length', None)),
+    ) + _common(pipe)
+
+
+def _point_row(element):
+    return (element.ref, _xy(element.geom)) + _common(element)
+
+
+def pipes_array(pipes):
+    return np.array([_pipe_row(pipe) for pipe in pipes], dtype=PIPE_DTYPE)
+
+
+def points_array(elements):
+    return np.array(
+        [_point_row(element) for element in elements], dtype=POINT_DTYPE)
+
+
+def observations_array(pipes):
+    return np.array([
+        (parent, observation.observation_type,
+         _float(observation.distance))
+        for parent, pipe in enumerate(pipes)
+        for observation in pipe.observations
+    ], dtype=OBSERVATION_DTYPE)
+
+
+def to_arrays(ribx):
+    """Return a dict of NumPy structured arrays, one per element list of
+    the ribx, plus 'observations' (of the inspection pipes)."""
+    return {
+        'inspection_pipes': pipes_array(ribx.inspection_pipes),
+        'cleaning_pipes': pipes_array(ribx.cleaning_pipes),
+        'inspection_manholes': points_array(ribx.inspection_manholes),
+        'cleaning_manholes': points_array(ribx.cleaning_manholes),
+        'drains': points_array(ribx.drains),
+        'observations': observations_array(ribx.inspection_pipes),
+    }
@@ -0,0 +1,400 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Compact binary format for parsed Ribx results.
+
+See ``Ribx.dump()`` and ``Ribx.load()``. A file consists of a header and
+sections, all little endian:
+
+- header: MAGIC, the format VERSION (uint16), the number of sections
+  (uint16), flags (uint16, INCOMPLETE if ``Ribx.complete`` is False) and
+  the (offset, size) of each section (2 x uint64), in the order of
+  SECTIONS;
+- strings: every distinct string (refs, owners, filenames, observation
+  fields) once: their number (uint32), the end offset of each (uint32) and
+  the UTF-8 data. Elsewhere, strings are referred to by index, NONE is
+  None;
+- indexes: string indexes (uint32) of media filenames and of observation
+  videos and photos; records refer to (start, count) ranges of it;
+- fields: observation fields as (tag, value) string index pairs (uint32);
+- observations: a fixed size record per observation;
+- one section per element list, with a fixed size record per element:
+  numbers are packed as int64/float64, coordinates as a dimension (0 for
+  no geometry) and three float64.
+
+Loading memory-maps the file. Each element list is decoded when it is
+first accessed (and the string table with the first), so a worker that
+only needs the drains doesn't decode the pipes.
+
+Not stored: the ``records`` of ``parsers.reparse()``, and the attributes
+of the manholes of pipes other than ref, sourceline, geom and media. Pipes
+that shared a Manhole (see ``ribxlib.network``) get one each.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+from datetime import timedelta
+import math
+import mmap
+import struct
+
+from ribxlib import geometry
+from ribxlib import models
+
+MAGIC = b'RIBXBIN\x00'
+VERSION = 1
+
+SECTIONS = (
+    'strings',
+    'indexes',
+    'fields',
+    'observations',
+) + models.Ribx.ELEMENT_LISTS
+
+NONE = 0xFFFFFFFF  # String index of None
+NO_DATE = -1 << 63
+NAN = float('nan')
+EPOCH = datetime(1970, 1, 1)
+
+INCOMPLETE = 1  # Header flag
+
+HEADER = struct.Struct(str('<8sHHH'))
+SECTION = struct.Struct(str('<QQ'))
+UINT32 = struct.Struct(str('<I'))
+
+# ref, owner, sourceline, inspection date (microseconds since EPOCH),
+# work_impossible, new, media (start, count)
+_COMMON = 'IIqqIBII'
+# dimension, x, y, z
+_POINT = 'Bddd'
+# ref, sourceline, media (start, count), point
+_PIPE_MANHOLE = 'IqII' + _POINT
+
+OBSERVATION = struct.Struct(str('<IIIIII'))  # fields, videos, photos
+POINT_ELEMENT = struct.Struct(str('<' + _COMMON + _POINT))
+PIPE = struct.Struct(str('<' + _COMMON + _PIPE_MANHOLE * 2))
+# manhole_start, expected_inspection_length, segment_length, observations
+INSPECTION_PIPE = struct.Struct(str(
+    '<' + _COMMON + _PIPE_MANHOLE * 2 + 'IddII'))
+
+# Element list -> (model, record struct)
+RECORDS = {
+    'inspection_pipes': (models.InspectionPipe, INSPECTION_PIPE),
+    'cleaning_pipes': (models.CleaningPipe, PIPE),
+    'inspection_manholes': (models.InspectionManhole, POINT_ELEMENT),
+    'cleaning_manholes': (models.CleaningManhole, POINT_ELEMENT),
+    'drains': (models.Drain, POINT_ELEMENT),
+}
+
+
+class FormatError(Exception):
+    """The file is not in (this version of) the binary format."""
+
+
+def dump(ribx, path):
+    """Write ribx to path in the binary format."""
+    writer = _Writer()
+    sections = {}
+    for name in models.Ribx.ELEMENT_LISTS:
+        sections[name] = writer.element_list(name, getattr(ribx, name))
+    sections['strings'] = writer.strings_section()
+    sections['indexes'] = _pack_uint32s(writer.indexes)
+    sections['fields'] = _pack_uint32s(writer.fields)
+    sections['observations'] = b''.join(writer.observations)
+
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    flags = 0 if ribx.complete else INCOMPLETE
+    header = [HEADER.pack(MAGIC, VERSION, len(SECTIONS), flags)]
+    for name in SECTIONS:
+        header.append(SECTION.pack(offset, len(sections[name])))
+        offset += len(sections[name])
+
+    with open(path, 'wb') as f:
+        f.write(b''.join(header))
+        for name in SECTIONS:
+            f.write(sections[name])
+
+
+def load(path):
+    """Return a Ribx from a file in the binary format. Its element lists are
+    decoded on first access."""
+    reader = Reader(path)
+    ribx = models.Ribx()
+    ribx.complete = not reader.flags & INCOMPLETE
+    ribx.set_loader(reader.element_list, close=reader.close)
+    return ribx
+
+
+class _Writer(object):
+
+    def __init__(self):
+        self.strings = {}
+        self.indexes = []
+        self.fields = []
+        self.observations = []
+
+    def string(self, value):
+        if value is None:
+            return NONE
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def string_range(self, values):
+        start = len(self.indexes)
+        self.indexes.extend(self.string(value) for value in values)
+        return start, len(self.indexes) - start
+
+    def strings_section(self):
+        data = []
+        ends = []
+        end = 0
+        for value in sorted(self.strings, key=self.strings.get):
+            encoded = value.encode('utf-8')
+            data.append(encoded)
+            end += len(encoded)
+            ends.append(UINT32.pack(end))
+        return b''.join([UINT32.pack(len(ends))] + ends + data)
+
+    def element_list(self, name, elements):
+        model, record = RECORDS[name]
+        return b''.join(record.pack(*self.element(element))
+                        for element in elements)
+
+    def element(self, element):
+        values = [
+            self.string(element.ref),
+            self.string(element.owner),
+            _int(element.sourceline),
+            _microseconds(element.inspection_date),
+            self.string(element.work_impossible),
+            bool(element.new),
+        ]
+        # _media, so that no empty sets are created
+        values.extend(self.string_range(sorted(element._media or ())))
+        if isinstance(element, models.Pipe):
+            for manhole in (element.manhole1, element.manhole2):
+                values.extend(self.pipe_manhole(manhole))
+            if isinstance(element, models.InspectionPipe):
+                values.append(self.string(element.manhole_start))
+                values.append(_float(element.expected_inspection_length))
+                values.append(_float(element.segment_length))
+                start = len(self.observations)
+                for observation in element.observations:
+                    self.observation(observation)
+                values.extend((start, len(self.observations) - start))
+        else:
+            values.extend(_point(element.geom))
+        return values
+
+    def pipe_manhole(self, manhole):
+        if manhole is None:
+            return [NONE, -1, 0, 0] + _point(None)
+        return ([self.string(manhole.ref), _int(manhole.sourceline)] +
+                list(self.string_range(sorted(manhole._media or ()))) +
+                _point(manhole.geom))
+
+    def observation(self, observation):
+        start = len(self.fields) // 2
+        for tag, value in observation.fields.items():
+            self.fields.append(self.string(tag))
+            self.fields.append(self.string(value))
+        values = [start, len(self.fields) // 2 - start]
+        values.extend(self.string_range(observation.videos))
+        values.extend(self.string_range(observation.photos))
+        self.observations.append(OBSERVATION.pack(*values))
+
+
+class Reader(object):
+    """Decodes the sections of a memory-mapped file on demand."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty file
+                raise FormatError("Not a binary Ribx file: {}".format(path))
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise FormatError("Not a binary Ribx file: {}".format(path))
+        magic, version, count, self.flags = HEADER.unpack_from(
+            self.data, 0)
+        if version != VERSION or count != len(SECTIONS):
+            self.close()
+            raise FormatError(
+                "Unsupported binary Ribx version: {}".format(version))
+
+        self.sections = {}
+        for i, name in enumerate(SECTIONS):
+            self.sections[name] = SECTION.unpack_from(
+                self.data, HEADER.size + i * SECTION.size)
+
+        self._strings = None
+        self._indexes = None
+        self._fields = None
+
+    def close(self):
+        self.data.close()
+
+    def _uint32s(self, offset, count):
+        return struct.unpack_from(str('<{}I').format(count), self.data, offset)
+
+    @property
+    def strings(self):
+        """All strings, decoded when first needed."""
+        if self._strings is None:
+            offset, size = self.sections['strings']
+            count = UINT32.unpack_from(self.data, offset)[0]
+            ends = self._uint32s(offset + UINT32.size, count)
+            start = offset + UINT32.size * (count + 1)
+            data = self.data[start:offset + size]
+            self._strings = []
+            begin = 0
+            for end in ends:
+                self._strings.append(data[begin:end].decode('utf-8'))
+                begin = end
+        return self._strings
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            offset, size = self.sections['indexes']
+            self._indexes = self._uint32s(offset, size // UINT32.size)
+        return self._indexes
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            offset, size = self.sections['fields']
+            self._fields = self._uint32s(offset, size // UINT32.size)
+        return self._fields
+
+    def string(self, index):
+        return None if index == NONE else self.strings[index]
+
+    def string_range(self, start, count):
+        strings = self.strings
+        return [strings[i] for i in self.indexes[start:start + count]]
+
+    def records(self, section, record):
+        offset, size = self.sections[section]
+        for position in range(offset, offset + size, record.size):
+            yield record.unpack_from(self.data, position)
+
+    def element_list(self, name):
+        """Return the elements of a list."""
+        model, record = RECORDS[name]
+        return [self.element(model, values)
+                for values in self.records(name, record)]
+
+    def element(self, model, values):
+        (ref, owner, sourceline, date, work_impossible, new, media_start,
+         media_count) = values[:8]
+        element = model(self.string(ref))
+        element.owner = self.string(owner)
+        element.sourceline = None if sourceline == -1 else sourceline
+        if date != NO_DATE:
+            element.inspection_date = EPOCH + timedelta(microseconds=date)
+        element.work_impossible = self.string(work_impossible)
+        element.new = bool(new)
+        if media_count:
+            element.media = self.string_range(media_start, media_count)
+
+        rest = values[8:]
+        if issubclass(model, models.Pipe):
+            element.manhole1 = self.pipe_manhole(rest[:8])
+            element.manhole2 = self.pipe_manhole(rest[8:16])
+            if issubclass(model, models.InspectionPipe):
+                (manhole_start, expected, segment, observations_start,
+                 observations_count) = rest[16:]
+                element.manhole_start = self.string(manhole_start)
+                element.expected_inspection_length = _none(expected)
+                element.segment_length = _none(segment)
+                element.observations = self.observations(
+                    observations_start, observations_count)
+        else:
+            element.geom = _geom(rest)
+        return element
+
+    def pipe_manhole(self, values):
+        ref, sourceline, media_start, media_count = values[:4]
+        if ref == NONE:
+            return None
+        manhole = models.Manhole(self.string(ref))
+        manhole.sourceline = None if sourceline == -1 else sourceline
+        if media_count:
+            manhole.media = self.string_range(media_start, media_count)
+        manhole.geom = _geom(values[4:])
+        return manhole
+
+    def observations(self, start, count):
+        strings = self.strings
+        indexes = self.indexes
+        all_fields = self.fields
+        offset = self.sections['observations'][0]
+        observations = []
+        for i in range(start, start + count):
+            (fields_start, fields_count, videos_start, videos_count,
+             photos_start, photos_count) = OBSERVATION.unpack_from(
+                 self.data, offset + OBSERVATION.size * i)
+            pairs = all_fields[2 * fields_start:
+                               2 * (fields_start + fields_count)]
+            fields = {}
+            for j in range(0, len(pairs), 2):
+                value = pairs[j + 1]
+                fields[strings[pairs[j]]] = (
+                    None if value == NONE else strings[value])
+            observations.append(models.Observation.from_fields(
+                fields,
+                [strings[k] for k in
+                 indexes[videos_start:videos_start + videos_count]],
+                [strings[k] for k in
+                 indexes[photos_start:photos_start + photos_count]]))
+        return observations
+
+
+def _pack_uint32s(values):
+    return struct.pack(str('<{}I').format(len(values)), *values)
+
+
+def _int(value):
+    return -1 if value is None else value
+
+
+def _float(value):
+    return NAN if value is None else value
+
+
+def _none(value):
+    return None if math.isnan(value) else value
+
+
+def _microseconds(value):
+    if value is None:
+        return NO_DATE
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _point(geom):
+    """Return [dimension, x, y, z] of a point geometry."""
+    if geom is None:
+        return [0, NAN, NAN, NAN]
+    if isinstance(geom, geometry.Point):
+        coords = geom.coords
+    else:  # OGR
+        coords = geom.GetPoint()[:geom.GetCoordinateDimension()]
+    return [len(coords)] + list(coords) + [NAN] * (3 - len(coords))
+
+
+def _geom(values):
+    dimension = values[0]
+    if not dimension:
+        return None
+    return geometry.make_point(*values[1:1 + dimension])
@@ -0,0 +1,229 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Opt-in cache of parse results, for files that are parsed repeatedly.
+
+Results are keyed by a hash of the file's content plus the parse mode, so a
+changed file is never served from the cache. The key also has the
+CACHE_VERSION and the version of the binary format, so that results of an
+older ribxlib aren't served either.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from io import BytesIO
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from ribxlib import binary
+from ribxlib import errors
+from ribxlib import geometry
+from ribxlib import parsers
+from ribxlib import sources
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+
+# Increase when parse results change, so that cached results aren't used.
+CACHE_VERSION = 1
+
+
+class ParseCache(object):
+    """Cache of ``parsers.parse`` results.
+
+    There is an in-memory LRU tier, limited to ``max_entries`` results and
+    (optionally) ``max_bytes``, where the size of an entry is the size of the
+    parsed file. If a ``directory`` is given, results are also stored there,
+    so they survive restarts and can be shared between processes: the Ribx
+    in the binary format (see ``ribxlib.binary`` for what isn't stored) and
+    the error log as JSON. Nothing in the directory is unpickled or
+    otherwise executed.
+
+    Cached results are shared between callers, so don't modify them.
+
+    """
+
+    def __init__(self, max_entries=32, max_bytes=None, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def parse(self, f, mode):
+        """Like ``parsers.parse``, but returns a cached (ribx, log) tuple if
+        the same content was parsed before in the same mode."""
+        if hasattr(f, 'read'):
+            data = f.read()
+            if not isinstance(data, bytes):  # Text mode
+                data = sources.encode(data)
+            digest = hashlib.sha256(data)
+            size = len(data)
+        else:
+            data = None
+            digest, size = _hash_file(f)
+
+        key = '{}-{}-{}-v{}.{}'.format(
+            digest.hexdigest(), mode.name, geometry.get_backend(),
+            CACHE_VERSION, binary.VERSION)
+
+        result = self._get(key)
+        if result is None:
+            result = self._load(key)
+            if result is None:
+                self._count(hit=False)
+                result = parsers.parse(
+                    f if data is None else BytesIO(data), mode)
+                self._store(key, result)
+            else:
+                self._count(hit=True)
+            self._put(key, result, size)
+        else:
+            self._count(hit=True)
+
+        return result
+
+    def clear(self):
+        """Empty the in-memory tier."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = entry  # Most recently used now
+            return entry[0]
+
+    def _put(self, key, result, size):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    (self.max_bytes is not None and
+                     self._bytes > self.max_bytes)):
+                __, (__, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def _paths(self, key):
+        """Return the paths of the Ribx and the error log of an entry."""
+        path = os.path.join(self.directory, key)
+        return path + '.ribx', path + '.json'
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        ribx_path, log_path = self._paths(key)
+        try:
+            with open(log_path, 'rb') as f:
+                error_log = _load_error_log(f.read())
+            ribx = binary.load(ribx_path)
+        except (IOError, OSError):
+            return None  # Not cached
+        except Exception as e:
+            logger.warning("Ignoring broken cache entry %s: %s", key, e)
+            return None
+        return ribx, error_log
+
+    def _store(self, key, result):
+        if self.directory is None:
+            return
+        ribx, error_log = result
+        try:
+            log_data = _dump_error_log(error_log)
+        except Exception as e:
+            logger.warning("Can't store parse result on disk: %s", e)
+            return
+
+        # Write to temporary files first, so that other processes never
+        # see a half-written cache file. The error log is moved into place
+        # first, as an entry is only used if both files exist. The disk
+        # tier is optional: if writing fails, the result is only kept in
+        # memory.
+        tmp = None
+        try:
+            ribx_path, log_path = self._paths(key)
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(log_data)
+            _replace(tmp, log_path)
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            os.close(fd)
+            binary.dump(ribx, tmp)
+            _replace(tmp, ribx_path)
+        except Exception as e:
+            logger.warning("Can't store parse result in %s: %s",
+                           self.directory, e)
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _dump_error_log(error_log):
+    """Return error_log as JSON: its dicts, and its ErrorRecords as lists.
+    Parameters that aren't JSON types are stored as their string, which is
+    all that the messages need."""
+    records = error_log.records() if isinstance(
+        error_log, errors.ErrorLog) else []
+    return json.dumps({
+        'entries': list(error_log),
+        'records': [
+            [record.code, record.tag, record.expr, record.line,
+             [param if isinstance(param, (int, float)) else
+              '{}'.format(param) for param in record.params]]
+            for record in records],
+    }).encode('utf-8')
+
+
+def _load_error_log(data):
+    """Return the ErrorLog in JSON data from _dump_error_log."""
+    data = json.loads(data.decode('utf-8'))
+    return errors.ErrorLog(data['entries'], [
+        errors.ErrorRecord(code, tag, expr, line, tuple(params))
+        for code, tag, expr, line, params in data['records']])
+
+
+def _replace(src, dst):
+    """Rename src to dst, overwriting dst (os.replace is Python 3 only)."""
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        os.rename(src, dst)
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest, size
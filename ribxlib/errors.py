@@ -0,0 +1,161 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Structured log of parsing errors.
+
+The problems found in records are reported as ``ErrorRecord`` instances
+(code, tag, expr, line, params). An ``ErrorLog`` is the list of ``{'line':
+..., 'message': ...}`` dicts that the parsers have always returned, and
+keeps the records besides. Identical errors share their message, which is
+formatted once per log.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from collections import OrderedDict
+import logging
+
+from ribxlib import models
+
+logger = logging.getLogger(__name__)
+
+# Number of different errors that is logged per ErrorLog; repeats of an
+# error are never logged.
+MAX_LOGGED = 20
+
+# Error code -> message, formatted with the params of the error.
+MESSAGES = {
+    'missing': "Expected {} record",
+    'manhole_start_mismatch': (
+        "manhole_start {} doesn't correspond to either manhole1 {} or "
+        "manhole2 {} of the pipe."),
+    'manhole_start_missing': (
+        "Inspection start node for pipes must be present. "
+        "Current mode: {}"),
+    'unknown_xd': 'Onbekende {}XD code "{}"',
+    'explanation_missing': 'Expected explanation for Z code in {} tag',
+    'explanation_not_allowed': (
+        'Explanation in {} tag not allowed without Z code.'),
+    'max_occurs': "maxOccurs = {} in {}",
+    'min_occurs': "minOccurs = {} in {}",
+    'exception': "{}",  # Any other exception, by its message
+}
+
+# Identical errors: their message and the line of each occurrence.
+ErrorGroup = namedtuple('ErrorGroup', ['message', 'lines'])
+
+
+class RecordError(models.ParseException):
+    """A problem with a record, raised while parsing it. The message is
+    MESSAGES[code] formatted with params, when it is needed."""
+
+    def __init__(self, code, *params):
+        super(RecordError, self).__init__(code, *params)
+        self.code = code
+        self.params = params
+
+    def __str__(self):
+        return MESSAGES[self.code].format(*self.params)
+
+
+class ErrorRecord(object):
+    """An error in the ``expr`` field of a ``tag`` record on a line."""
+    __slots__ = ('code', 'tag', 'expr', 'line', 'params')
+
+    def __init__(self, code, tag, expr, line, params=()):
+        self.code = code
+        self.tag = tag
+        self.expr = expr
+        self.line = line
+        self.params = params
+
+    @classmethod
+    def from_exception(cls, tag, expr, line, e):
+        if isinstance(e, RecordError):
+            return cls(e.code, tag, expr, line, e.params)
+        return cls('exception', tag, expr, line, ('{}'.format(e),))
+
+    @property
+    def key(self):
+        """What identical errors have in common: all but the line."""
+        return self.code, self.tag, self.expr, self.params
+
+    @property
+    def message(self):
+        return "Element {} has problems with {}: {}".format(
+            self.tag, self.expr, MESSAGES[self.code].format(*self.params))
+
+    def as_dict(self):
+        return {'line': self.line, 'message': self.message}
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return 'ErrorRecord({!r}, {!r}, {!r}, {!r}, {!r})'.format(
+            self.code, self.tag, self.expr, self.line, self.params)
+
+
+class ErrorLog(list):
+    """Parsing errors in document order, as a list of dicts.
+
+    Errors found in records are added with ``report()``, which appends a
+    ``{'line': ..., 'message': ...}`` dict. The syntax errors reported by
+    lxml are appended as they are (they have 'column' and 'level' as
+    well).
+
+    """
+
+    def __init__(self, entries=(), records=()):
+        super(ErrorLog, self).__init__(entries)
+        self._records = list(records)
+        self._messages = {}  # ErrorRecord key -> message
+
+    def report(self, record):
+        """Append an ErrorRecord, and log it unless an identical error has
+        been reported before or MAX_LOGGED different errors have been
+        logged already."""
+        key = record.key
+        message = self._messages.get(key)
+        if message is None:
+            message = self._messages[key] = record.message
+            if len(self._messages) <= MAX_LOGGED:
+                logger.error('%s', message)
+            elif len(self._messages) == MAX_LOGGED + 1:
+                logger.error("More than %d different parsing errors, not "
+                             "logging the rest", MAX_LOGGED)
+        self.append({'line': record.line, 'message': message})
+        self._records.append(record)
+
+    def records(self):
+        """Return the reported ErrorRecords, in order."""
+        return list(self._records)
+
+    def groups(self):
+        """Return a list of ErrorGroups, in order of first occurrence."""
+        groups = OrderedDict()
+        for entry in self:
+            group = groups.get(entry['message'])
+            if group is None:
+                group = groups[entry['message']] = ErrorGroup(
+                    entry['message'], [])
+            group.lines.append(entry['line'])
+        return list(groups.values())
+
+    def summary(self):
+        """Return a line per ErrorGroup, with the number of errors if there
+        is more than one, e.g. 'Element ZB_A has problems with AXD:
+        Onbekende AXD code "Q" \xd73,412'."""
+        return [
+            group.message if len(group.lines) == 1 else
+            "{} \xd7{:,}".format(group.message, len(group.lines))
+            for group in self.groups()]
+
+    def extend(self, entries):
+        super(ErrorLog, self).extend(entries)
+        if isinstance(entries, ErrorLog):
+            self._records.extend(entries._records)
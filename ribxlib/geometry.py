@@ -0,0 +1,204 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Geometries of parsed sewer elements.
+
+By default, geometries are small value objects that only hold coordinates.
+They mimic the part of the OGR geometry API that is useful for points and
+lines, and are converted to OGR, WKB or WKT only when asked for. GDAL/OGR is
+an optional dependency; ``set_backend('ogr')`` makes the parser build
+``ogr.Geometry`` objects instead, like it used to.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import math
+import struct
+
+try:
+    from osgeo import ogr
+except ImportError:
+    ogr = None
+
+# WKB geometry types (ISO flavour for 3D).
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_Z = 1000
+
+
+def _format_coords(coords):
+    return ' '.join(repr(float(c)) for c in coords)
+
+
+class Point(object):
+    """A 2D or 3D point."""
+    __slots__ = ('coords',)
+
+    def __init__(self, *coords):
+        self.coords = coords
+
+    def __eq__(self, other):
+        return isinstance(other, Point) and self.coords == other.coords
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.coords)
+
+    def __repr__(self):
+        return 'Point{!r}'.format(self.coords)
+
+    def GetX(self):
+        return self.coords[0]
+
+    def GetY(self):
+        return self.coords[1]
+
+    def GetZ(self):
+        return self.coords[2] if len(self.coords) > 2 else 0.0
+
+    def GetPoint(self):
+        """Return an (x, y, z) tuple, like OGR does."""
+        return (self.GetX(), self.GetY(), self.GetZ())
+
+    def ExportToWkt(self):
+        return 'POINT ({})'.format(_format_coords(self.coords))
+
+    def ExportToWkb(self):
+        """Return little endian (ISO) WKB."""
+        return _wkb(WKB_POINT, len(self.coords), [self.coords])
+
+    def to_ogr(self):
+        return ogr_point(*self.coords)
+
+
+class LineString(object):
+    """A line through two or more points."""
+    __slots__ = ('points',)
+
+    def __init__(self, *points):
+        # Tuples of coordinates
+        self.points = points
+
+    def __eq__(self, other):
+        return isinstance(other, LineString) and self.points == other.points
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.points)
+
+    def __repr__(self):
+        return 'LineString{!r}'.format(self.points)
+
+    def GetPointCount(self):
+        return len(self.points)
+
+    def GetPoint(self, i=0):
+        return Point(*self.points[i]).GetPoint()
+
+    def GetPoints(self):
+        return [Point(*coords).GetPoint() for coords in self.points]
+
+    def Length(self):
+        xy = [coords[:2] for coords in self.points]
+        return sum(math.hypot(x2 - x1, y2 - y1)
+                   for (x1, y1), (x2, y2) in zip(xy, xy[1:]))
+
+    def ExportToWkt(self):
+        return 'LINESTRING ({})'.format(
+            ','.join(_format_coords(coords) for coords in self.points))
+
+    def ExportToWkb(self):
+        """Return little endian (ISO) WKB."""
+        dimension = max(len(coords) for coords in self.points)
+        return _wkb(WKB_LINESTRING, dimension, self.points, count=True)
+
+    def to_ogr(self):
+        return ogr_line_string(*[Point(*p) for p in self.points])
+
+
+def _wkb(geometry_type, dimension, points, count=False):
+    if dimension > 2:
+        geometry_type += WKB_Z
+    data = [struct.pack('<BI', 1, geometry_type)]
+    if count:
+        data.append(struct.pack('<I', len(points)))
+    for coords in points:
+        coords = tuple(coords) + (0.0,) * (dimension - len(coords))
+        data.append(struct.pack('<{}d'.format(dimension), *coords))
+    return b''.join(data)
+
+
+def point(*coords):
+    if len(coords) not in (2, 3):
+        raise ValueError(
+            "Expected 2 or 3 coordinates, got {}".format(len(coords)))
+    return Point(*coords)
+
+
+def line_string(*points):
+    return LineString(*[p.coords if isinstance(p, Point) else p.GetPoint()
+                        for p in points])
+
+
+def ogr_point(*coords):
+    _require_ogr()
+    point = ogr.Geometry(ogr.wkbPoint)
+    point.AddPoint(*coords)
+    return point
+
+
+def ogr_line_string(*points):
+    _require_ogr()
+    line = ogr.Geometry(ogr.wkbLineString)
+    for p in points:
+        line.AddPoint(*p.GetPoint())
+    return line
+
+
+def _require_ogr():
+    if ogr is None:
+        raise ImportError("GDAL/OGR (osgeo) is not installed")
+
+
+# Name -> (point factory, line factory)
+BACKENDS = {
+    'simple': (point, line_string),
+    'ogr': (ogr_point, ogr_line_string),
+}
+
+_backend_name = 'simple'
+_backend = BACKENDS[_backend_name]
+
+
+def set_backend(name):
+    """Choose the kind of geometries the parser builds: 'simple' (the
+    default) or 'ogr'."""
+    global _backend, _backend_name
+    if name not in BACKENDS:
+        raise ValueError("Unknown geometry backend: {}".format(name))
+    if name == 'ogr':
+        _require_ogr()
+    _backend_name = name
+    _backend = BACKENDS[name]
+
+
+def get_backend():
+    """Return the name of the current backend."""
+    return _backend_name
+
+
+def make_point(*coords):
+    """Return a point, built by the current backend."""
+    return _backend[0](*coords)
+
+
+def make_line_string(*points):
+    """Return a line through points, built by the current backend."""
+    return _backend[1](*points)
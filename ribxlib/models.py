@@ -10,7 +10,7 @@ import logging
 import ntpath
 import os
 
-from osgeo import ogr
+from ribxlib import geometry
 
 logger = logging.getLogger(__name__)
 
@@ -19,37 +19,272 @@ class ParseException(Exception):
     pass
 
 
+class ElementList(list):
+    """List of elements that tells its Ribx when it is modified, so that
+    the Ribx's indexes can be invalidated."""
+
+    def __init__(self, elements=(), ribx=None):
+        super(ElementList, self).__init__(elements)
+        self.ribx = ribx
+
+    def _changed(self):
+        # No ribx attribute yet while unpickling
+        ribx = getattr(self, 'ribx', None)
+        if ribx is not None:
+            ribx.invalidate()
+
+
+def _notifying(name):
+    method = getattr(list, name)
+
+    def notifying(self, *args):
+        result = method(self, *args)
+        self._changed()
+        return result
+
+    notifying.__name__ = str(name)
+    return notifying
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__',
+              '__imul__'):
+    setattr(ElementList, _name, _notifying(_name))
+if hasattr(list, 'clear'):
+    ElementList.clear = _notifying('clear')
+
+
+def _element_list(name):
+    """Property for a list of elements of a Ribx."""
+    attribute = '_' + name
+
+    def getter(self):
+        elements = getattr(self, attribute)
+        if elements is None:  # Not loaded yet, see Ribx.set_loader
+            elements = self._load(name)
+        return elements
+
+    def setter(self, elements):
+        setattr(self, attribute, ElementList(elements, self))
+        self.invalidate()
+
+    return property(getter, setter)
+
+
 class Ribx(object):
 
+    # The element lists, in the order used by elements().
+    ELEMENT_LISTS = (
+        'inspection_pipes',
+        'cleaning_pipes',
+        'inspection_manholes',
+        'cleaning_manholes',
+        'drains',
+    )
+
+    # Indexes that are rebuilt when media of elements change.
+    MEDIA_INDEXES = ('media', 'media_set')
+
+    inspection_pipes = _element_list('inspection_pipes')
+    cleaning_pipes = _element_list('cleaning_pipes')
+    inspection_manholes = _element_list('inspection_manholes')
+    cleaning_manholes = _element_list('cleaning_manholes')
+    drains = _element_list('drains')
+
     def __init__(self):
+        # Lazily built indexes, invalidated when an element list changes.
+        self._indexes = {}
+        # SewerElement.media_version when the media indexes were built.
+        self._media_version = None
+
         self.inspection_pipes = []
         self.cleaning_pipes = []
         self.inspection_manholes = []
         self.cleaning_manholes = []
         self.drains = []
 
+        # Content hash -> (line, ref, element) tuples of the records this
+        # was parsed from; only set by parsers.reparse.
+        self.records = None
+
+        # False if parsing stopped early, because the error budget ran
+        # out; see parsers.parse.
+        self.complete = True
+
+        # Function that returns the elements of a list that has not been
+        # loaded yet, and one to call when all are; see set_loader.
+        self._loader = None
+        self._close = None
+
+    def __getstate__(self):
+        for name in self.ELEMENT_LISTS:
+            getattr(self, name)  # Load them, if necessary
+        state = self.__dict__.copy()
+        state['_indexes'] = {}
+        return state
+
+    def set_loader(self, loader, close=None):
+        """Have the element lists be loaded on first access, by calling
+        loader with the name of the list. The lists are emptied; close is
+        called once all have been loaded."""
+        for name in self.ELEMENT_LISTS:
+            setattr(self, '_' + name, None)
+        self._loader = loader
+        self._close = close
+        self.invalidate()
+
+    def _load(self, name):
+        elements = ElementList(self._loader(name), self)
+        setattr(self, '_' + name, elements)
+        if all(getattr(self, '_' + other) is not None
+               for other in self.ELEMENT_LISTS):
+            if self._close is not None:
+                self._close()
+            self._loader = self._close = None
+        return elements
+
+    def dump(self, path):
+        """Write this RIBX to path in a compact binary format, see
+        ``ribxlib.binary``."""
+        from ribxlib import binary
+        binary.dump(self, path)
+
+    @staticmethod
+    def load(path):
+        """Return a Ribx from a file written by ``dump()``. The file is
+        memory-mapped and the element lists are decoded on first access."""
+        from ribxlib import binary
+        return binary.load(path)
+
+    def add(self, element):
+        """Append element to the list for its kind of element."""
+        getattr(self, element.collection).append(element)
+
+    def elements(self):
+        """Generate all elements in this RIBX."""
+        for name in self.ELEMENT_LISTS:
+            for element in getattr(self, name):
+                yield element
+
+    def invalidate(self):
+        """Forget the indexes. This happens automatically when the element
+        lists are modified or media are added to elements; call it after
+        changing refs of the elements themselves, or media sets that were
+        read before."""
+        self._indexes.clear()
+
+    def _index(self, name):
+        if name in self.MEDIA_INDEXES and (
+                self._media_version != SewerElement.media_version):
+            for media_index in self.MEDIA_INDEXES:
+                self._indexes.pop(media_index, None)
+            self._media_version = SewerElement.media_version
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = getattr(self, '_build_' + name)()
+        return index
+
+    def _build_refs(self):
+        index = {}
+        for element in self.elements():
+            index.setdefault(element.ref, []).append(element)
+        return index
+
+    def _build_manholes(self):
+        index = {}
+        for pipe in self.inspection_pipes + self.cleaning_pipes:
+            for manhole in (pipe.manhole1, pipe.manhole2):
+                if manhole is not None:
+                    pipes = index.setdefault(manhole.ref, [])
+                    if not pipes or pipes[-1] is not pipe:
+                        pipes.append(pipe)
+        return index
+
+    def _build_media(self):
+        index = {}
+        for element in self.elements():
+            # Read _media, so that no empty sets are created.
+            media = set(element._media or ())
+            if isinstance(element, Pipe):
+                for manhole in (element.manhole1, element.manhole2):
+                    if manhole is not None:
+                        media.update(manhole._media or ())
+            for filename in media:
+                index.setdefault(filename, []).append(element)
+        return index
+
+    def _build_media_set(self):
+        return frozenset(self._index('media'))
+
+    def _build_spatial(self):
+        from ribxlib import spatial
+        return spatial.SpatialIndex(self.elements())
+
+    def elements_by_ref(self, ref):
+        """Return the elements with this ref. There can be several, e.g. two
+        inspections of the same pipe, starting at either end."""
+        return self._index('refs').get(ref, [])
+
+    def pipes_by_manhole(self, ref):
+        """Return the pipes that start or end at the manhole with this
+        ref."""
+        return self._index('manholes').get(ref, [])
+
+    def elements_by_media(self, filename):
+        """Return the elements that mention this media file. Media of the
+        manholes of a pipe are attributed to the pipe."""
+        return self._index('media').get(filename, [])
+
     @property
     def media(self):
-        """Combine the media sets of all elements in this RIBX."""
-        media = set()
-        for pipe in self.inspection_pipes + self.cleaning_pipes:
-            media.update(pipe.media)
-            media.update(pipe.manhole1.media)
-            media.update(pipe.manhole2.media)
-        for manhole in self.inspection_manholes + self.cleaning_manholes:
-            media.update(manhole.media)
-        for drain in self.drains:
-            media.update(drain.media)
-        return media
+        """Combine the media sets of all elements in this RIBX.
+
+        This is a new set, copied from one that is kept until the element
+        lists or the media of the elements change, like the indexes; see
+        ``elements_by_media()`` for the elements that mention each file.
+
+        """
+        return set(self._index('media_set'))
+
+    def spatial_index(self):
+        """Return a ``ribxlib.spatial.SpatialIndex`` of the elements in this
+        RIBX, for bounding box, radius and nearest neighbour queries. It is
+        kept until the element lists change. Requires NumPy.
+
+        """
+        return self._index('spatial')
+
+    def to_arrays(self):
+        """Return NumPy structured arrays of the elements in this RIBX.
+
+        See ``ribxlib.arrays.to_arrays``. Requires NumPy.
+
+        """
+        from ribxlib import arrays
+        return arrays.to_arrays(self)
 
 
 class SewerElement(object):
     """Common superclass for pipes, drains and manholes. The more we
-    can put in here, the better."""
+    can put in here, the better.
+
+    The models use ``__slots__``, as a file can hold hundreds of thousands
+    of them; a subclass that adds attributes must declare them in its own
+    ``__slots__``.
+
+    """
+    __slots__ = ('ref', 'inspection_date', '_media', 'sourceline',
+                 'work_impossible', 'new', 'owner')
+
     # According to the spec, not everything can have the video
     # tag. Subclasses that can set this to True.
     has_video = False
 
+    # Increased whenever the media of an element may change (media is read
+    # or set, or add_media is called), so that a Ribx knows when its media
+    # indexes are outdated.
+    media_version = 0
+
     def __init__(self, ref):
         # Code of this element
         self.ref = ref
@@ -58,8 +293,9 @@ class SewerElement(object):
         # filled in if the work was done (or turned out not to be possible).
         self.inspection_date = None
 
-        # A set of related filenames that will be uploaded later.
-        self.media = set()
+        # A set of related filenames that will be uploaded later. It is only
+        # created when needed, see media.
+        self._media = None
 
         # Line in the RIBX file where this element's node started.
         self.sourceline = None
@@ -71,6 +307,31 @@ class SewerElement(object):
         # True if a '*XC' tag was used ("ontbreekt in opdracht")
         self.new = False
 
+        # ?AQ: Ownership
+        self.owner = None
+
+    @property
+    def media(self):
+        """The set of related filenames that will be uploaded later."""
+        SewerElement.media_version += 1  # It may be modified
+        if self._media is None:
+            self._media = set()
+        return self._media
+
+    @media.setter
+    def media(self, media):
+        SewerElement.media_version += 1
+        self._media = set(media)
+
+    def add_media(self, filenames):
+        """Add filenames to the media set, without creating an empty one."""
+        SewerElement.media_version += 1
+        media = self._media
+        for filename in filenames:
+            if media is None:
+                media = self._media = set()
+            media.add(filename)
+
     def print_for_debug(self):
         print(self.ref)
         print('-' * len(self.ref))
@@ -83,6 +344,8 @@ class Pipe(SewerElement):
     """Sewerage pipe (`rioolbuis` in Dutch).
 
     """
+    __slots__ = ('manhole1', 'manhole2')
+
     has_video = True
 
     def __init__(self, ref):
@@ -96,10 +359,8 @@ class Pipe(SewerElement):
     @property
     def geom(self):
         try:
-            line = ogr.Geometry(ogr.wkbLineString)
-            line.AddPoint(*self.manhole1.geom.GetPoint())
-            line.AddPoint(*self.manhole2.geom.GetPoint())
-            return line
+            return geometry.make_line_string(
+                self.manhole1.geom, self.manhole2.geom)
         except Exception as e:
             logger.error(e)
 
@@ -109,7 +370,11 @@ class Pipe(SewerElement):
 
 
 class InspectionPipe(Pipe):
+    __slots__ = ('manhole_start', 'expected_inspection_length',
+                 'segment_length', 'observations')
+
     tag = 'ZB_A'
+    collection = 'inspection_pipes'
 
     def __init__(self, ref):
         super(InspectionPipe, self).__init__(ref)
@@ -131,13 +396,18 @@ class InspectionPipe(Pipe):
 
 
 class CleaningPipe(Pipe):
+    __slots__ = ()
+
     tag = 'ZB_G'
+    collection = 'cleaning_pipes'
 
 
 class Manhole(SewerElement):
     """A covered hole to a sewerage pipe (`put` in Dutch).
 
     """
+    __slots__ = ('geom',)
+
     has_video = True
 
     def __init__(self, ref):
@@ -149,18 +419,27 @@ class Manhole(SewerElement):
 
 
 class InspectionManhole(Manhole):
+    __slots__ = ()
+
     tag = 'ZB_C'
+    collection = 'inspection_manholes'
 
 
 class CleaningManhole(Manhole):
+    __slots__ = ()
+
     tag = 'ZB_J'
+    collection = 'cleaning_manholes'
 
 
 class Drain(SewerElement):
     """A storm drain (`kolk` in Dutch).
 
     """
+    __slots__ = ('geom',)
+
     tag = 'ZB_E'
+    collection = 'drains'
 
     def __init__(self, ref):
         super(Drain, self).__init__(ref)
@@ -171,6 +450,16 @@ class Drain(SewerElement):
         return self.ref
 
 
+# The ZB_* records that are parsed into SewerElements, by tag.
+MODELS = {model.tag: model for model in (
+    InspectionPipe,
+    CleaningPipe,
+    InspectionManhole,
+    CleaningManhole,
+    Drain,
+)}
+
+
 def _check_filename(path):
     """Check file name.
 
@@ -190,32 +479,58 @@ def _check_filename(path):
 
 
 class Observation(object):
-    """Represents the data in a ZC record, and interprets it."""
+    """Represents the data in a ZC record, and interprets it.
+
+    Everything is extracted from the ZC node when the observation is built.
+    No reference to the node is kept, so the document can be freed right
+    after parsing.
+
+    """
+    __slots__ = ('observation_type', 'distance', 'fields', 'videos', 'photos')
+
     def __init__(self, zc_node):
-        self.zc_node = zc_node
-        self.distance = self._extract_value('I')
+        fields = {}
+        videos = []
+        photos = []
+
+        for child in zc_node:
+            if callable(child.tag):
+                continue  # Comment or processing instruction
+            elif child.tag == 'N':
+                # Video filename with an optional '|'
+                videos.append(child.text.split('|')[0].strip())
+            elif child.tag == 'M':
+                # Photo filename
+                photos.append(child.text.strip())
+            elif child.tag not in fields:
+                text = child.text
+                fields[child.tag] = text.strip() if text is not None else None
+
+        self._set(fields, videos, photos)
+
+    @classmethod
+    def from_fields(cls, fields, videos=(), photos=()):
+        """Return an observation with these fields (by tag), videos and
+        photos, e.g. as stored by ``ribxlib.binary``."""
+        observation = cls.__new__(cls)
+        observation._set(fields, videos, photos)
+        return observation
+
+    def _set(self, fields, videos, photos):
+        # All other fields (A, B, C, D, G, H, I, ...) by tag
+        self.fields = fields
+        self.videos = tuple(videos)
+        self.photos = tuple(photos)
+
+        self.distance = fields.get('I')
         if self.distance is not None:
             self.distance = float(self.distance)
-        self.observation_type = self._extract_value('A')
-
-    def _extract_value(self, tag_name):
-        try:
-            return self.zc_node.xpath(tag_name)[0].text.strip()
-        except:  # Bare except
-            return None
+        self.observation_type = fields.get('A')
 
     def media(self):
         """Generate the filenames mentioned. Raises ParseException if something
         is wrong with a filename."""
-        for n_node in self.zc_node.xpath('N'):
-            # Video fileame with an optional '|'
-            path = n_node.text.split('|')[0].strip()
-            _check_filename(path)
-            yield path
-
-        for m_node in self.zc_node.xpath('M'):
-            # Photo filename
-            path = m_node.text.strip()
+        for path in self.videos + self.photos:
             _check_filename(path)
             yield path
 
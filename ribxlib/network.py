@@ -0,0 +1,224 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Sewer network graph of the pipes and manholes in a parsed Ribx.
+
+The parser gives every pipe two manholes of its own (from ?AD/?AE and
+?AF/?AG), unrelated to the manholes of other pipes or to the ZB_C and ZB_J
+manhole records. ``build()`` is an optional stage after parsing that
+numbers the manholes by ref, links them to their records, builds adjacency
+arrays of pipes and manholes, and reports refs whose coordinates differ.
+Optionally, it makes the pipes share their manholes.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from array import array
+from collections import namedtuple
+import math
+
+# Maximum distance between the coordinates of the same manhole.
+TOLERANCE = 0.01
+
+# A manhole ref with different coordinates: a list of (element, sourceline,
+# (x, y)) per occurrence, where element is a pipe or manhole record.
+Conflict = namedtuple('Conflict', ['ref', 'locations'])
+
+
+class Network(object):
+    """Pipes as edges between manholes, numbered by position.
+
+    Attributes:
+      refs (list): Manhole ref per node.
+      manholes (list): A Manhole per node: the first of a pipe, or the
+        record if no pipe connects to it.
+      records (list): The manhole records (InspectionManhole,
+        CleaningManhole) per node; a manhole can be inspected and cleaned.
+      pipes (list): Pipe per edge.
+      start, end (array): Node of manhole1 and manhole2 per edge.
+      offsets, adjacent, incident (array): Adjacency in compressed sparse
+        row form; the neighbours of node i are adjacent[offsets[i]:offsets[i
+        + 1]] and the pipes leading to them incident[...] (same slice).
+      conflicts (list): Conflicts, see ``build()``.
+
+    """
+
+    def __init__(self):
+        self.refs = []
+        self.manholes = []
+        self.records = []
+        self.pipes = []
+        self.start = array(str('l'))
+        self.end = array(str('l'))
+        self.offsets = array(str('l'))
+        self.adjacent = array(str('l'))
+        self.incident = array(str('l'))
+        self.conflicts = []
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self.refs)
+
+    def node(self, ref):
+        """Return the node of a manhole ref. Raises KeyError if unknown."""
+        return self._nodes[ref]
+
+    def degree(self, node):
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def neighbours(self, node):
+        """Return a list of (node, pipe) pairs: the manholes connected to this
+        one, and the pipes that connect them."""
+        i, j = self.offsets[node], self.offsets[node + 1]
+        return [(self.adjacent[k], self.pipes[self.incident[k]])
+                for k in range(i, j)]
+
+    def components(self):
+        """Return the number of the connected component of each node, as an
+        array. Components are numbered from 0, by their first node."""
+        component = array(str('l'), [-1]) * len(self)
+        count = 0
+        for first in range(len(self)):
+            if component[first] != -1:
+                continue
+            component[first] = count
+            stack = [first]
+            while stack:
+                node = stack.pop()
+                for k in range(self.offsets[node], self.offsets[node + 1]):
+                    neighbour = self.adjacent[k]
+                    if component[neighbour] == -1:
+                        component[neighbour] = count
+                        stack.append(neighbour)
+            count += 1
+        return component
+
+    def _add_node(self, ref):
+        node = self._nodes.get(ref)
+        if node is None:
+            node = self._nodes[ref] = len(self.refs)
+            self.refs.append(ref)
+            self.manholes.append(None)
+            self.records.append([])
+        return node
+
+
+def build(ribx, tolerance=TOLERANCE, share=False):
+    """Build the network of the pipes and manhole records in a Ribx.
+
+    The Ribx isn't changed, unless share is True.
+
+    Args:
+      ribx (Ribx): A parsed Ribx.
+      tolerance (float): Coordinates of the same manhole ref that are further
+        apart than this are reported as a conflict.
+      share (bool): Replace the manholes of the pipes by one Manhole per ref
+        (the first), to save memory. This changes the Ribx: the pipes'
+        manhole1 and manhole2 attributes are replaced, so a manhole's
+        sourceline is that of its first occurrence, and changing one changes
+        it for all pipes. Refs with conflicting coordinates and manholes with
+        media are left alone. Default False.
+
+    Returns:
+      A Network. Its conflicts attribute lists the refs with different
+      coordinates, in order of their first occurrence.
+
+    """
+    network = Network()
+    locations = []  # Per node
+
+    def add(ref, element, sourceline, geom):
+        node = network._add_node(ref)
+        if node == len(locations):
+            locations.append([])
+        if geom is not None:
+            locations[node].append(
+                (element, sourceline, (geom.GetX(), geom.GetY())))
+        return node
+
+    pipes = list(ribx.inspection_pipes) + list(ribx.cleaning_pipes)
+    for pipe in pipes:
+        start = add(pipe.manhole1.ref, pipe, pipe.manhole1.sourceline,
+                    pipe.manhole1.geom)
+        end = add(pipe.manhole2.ref, pipe, pipe.manhole2.sourceline,
+                  pipe.manhole2.geom)
+        for node, manhole in ((start, pipe.manhole1), (end, pipe.manhole2)):
+            if network.manholes[node] is None:
+                network.manholes[node] = manhole
+        network.pipes.append(pipe)
+        network.start.append(start)
+        network.end.append(end)
+
+    for record in list(ribx.inspection_manholes) + \
+            list(ribx.cleaning_manholes):
+        node = add(record.ref, record, record.sourceline, record.geom)
+        network.records[node].append(record)
+        if network.manholes[node] is None:
+            network.manholes[node] = record
+
+    conflicting = set()
+    for node, node_locations in enumerate(locations):
+        if _conflict(node_locations, tolerance):
+            conflicting.add(node)
+            network.conflicts.append(
+                Conflict(network.refs[node], node_locations))
+
+    if share:
+        for pipe, start, end in zip(pipes, network.start, network.end):
+            if _shareable(network, start, pipe.manhole1, conflicting):
+                pipe.manhole1 = network.manholes[start]
+            if _shareable(network, end, pipe.manhole2, conflicting):
+                pipe.manhole2 = network.manholes[end]
+        ribx.invalidate()
+
+    _adjacency(network)
+    return network
+
+
+def _shareable(network, node, manhole, conflicting):
+    """Return whether a pipe can use the shared manhole of a node instead of
+    this one. Media of the manholes of a pipe are attributed to the pipe, so
+    manholes with media aren't shared (_media, to not create empty sets)."""
+    shared = network.manholes[node]
+    return (node not in conflicting and
+            not manhole._media and not shared._media)
+
+
+def _conflict(locations, tolerance):
+    """Return whether any location is further than tolerance from the
+    first."""
+    if len(locations) < 2:
+        return False
+    x0, y0 = locations[0][2]
+    return any(math.hypot(x - x0, y - y0) > tolerance
+               for element, sourceline, (x, y) in locations[1:])
+
+
+def _adjacency(network):
+    """Fill the compressed sparse row arrays from start and end."""
+    degree = [0] * len(network)
+    for start, end in zip(network.start, network.end):
+        degree[start] += 1
+        degree[end] += 1
+
+    offsets = [0]
+    for count in degree:
+        offsets.append(offsets[-1] + count)
+
+    position = offsets[:-1]
+    adjacent = [0] * offsets[-1]
+    incident = [0] * offsets[-1]
+    for edge, (start, end) in enumerate(zip(network.start, network.end)):
+        adjacent[position[start]] = end
+        incident[position[start]] = edge
+        position[start] += 1
+        adjacent[position[end]] = start
+        incident[position[end]] = edge
+        position[end] += 1
+
+    network.offsets = array(str('l'), offsets)
+    network.adjacent = array(str('l'), adjacent)
+    network.incident = array(str('l'), incident)
@@ -6,30 +6,81 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from collections import namedtuple
+import copy
 from datetime import datetime
+import hashlib
+import io
 import logging
+import multiprocessing
+import re
 
 from enum import Enum
 from lxml import etree
-from osgeo import ogr
 
+from ribxlib import errors
+from ribxlib import geometry
 from ribxlib import models
+from ribxlib import records
+from ribxlib import sources
+from ribxlib.stats import timer
 
 logger = logging.getLogger(__name__)
 
+# ElementParser methods that are timed when collecting ParseStats.
+INSTRUMENTED_METHODS = (
+    'parse',
+    'children',
+    'tag_value',
+    'tag_attribute',
+    'tag_point',
+    'get_manhole_start',
+    'get_work_impossible',
+    'get_inspection_date',
+    'get_video',
+    'get_observations',
+)
+
+# Approximate size of the chunks of records that parse_parallel hands to
+# each worker.
+CHUNK_SIZE = 1 << 20
+
+# Inspection dates and times that were parsed before, see _parse_datetime.
+# A file usually has only a few distinct dates.
+DATETIME_CACHE_SIZE = 1024
+_datetime_cache = {}
+
+# Maximum size of the table of repeated strings (manhole refs, owners) that
+# are shared between the elements of a parse, see _intern.
+INTERN_SIZE = 1 << 16
+
+_DATE_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})\Z')
+_TIME_RE = re.compile(r'([0-9]{2}):([0-9]{2}):([0-9]{2})\Z')
+
 # NAMESPACES
 
 NS = {
     "gml": "http://www.opengis.net/gml",
 }
 
+GML_POINT = '{{{}}}Point'.format(NS['gml'])
+GML_POS = '{{{}}}pos'.format(NS['gml'])
+
 
 class Mode(Enum):
     PREINSPECTION = 1  # Ordering party -> contractor.
     INSPECTION = 2  # Contractor -> ordering party.
 
 
-def parse(f, mode):
+# Refs of the elements that were added, removed or changed, see reparse.
+Changes = namedtuple('Changes', ['added', 'removed', 'changed'])
+
+# Result of quick_scan: the number of records per ZB_* tag, the set of media
+# filenames and the first and last inspection date (or None).
+Summary = namedtuple('Summary', ['counts', 'media', 'first_date', 'last_date'])
+
+
+def parse(f, mode, stats=None, max_errors=None, fail_fast=False):
     """Parse a GWSW.Ribx / GWSW.Ribx-A document.
 
     GWSW.Ribx and GWSW.Ribx-A are immature standards. Their current versions
@@ -41,120 +92,881 @@ def parse(f, mode):
     Args:
       f (string): Full path to the file to be parsed.
       mode (Enum): See ribx.parsers.Mode.
+      stats (ParseStats): Optional, collects timings and counts; see
+        ribxlib.stats.
+      max_errors (int): Optional error budget: stop parsing as soon as the
+        log holds this many errors. The document is then read record by
+        record, like ``iterparse`` does, so a broken upload is rejected
+        without reading the rest of it (which is then not checked for well
+        formedness either).
+      fail_fast (bool): Stop at the first error, i.e. max_errors=1.
 
     Returns:
       A (ribx, log) tuple. The ribxlib.models.Ribx instance carries
       the pipes, manholes and drains (to be) inspected/cleaned.
-      Log is a list that contains all parsing errors.
+      Log is an ErrorLog (see ribxlib.errors): a list of dicts with all
+      parsing errors, which also groups identical ones. If the error budget
+      ran out, the ribx holds the elements before the last error and the
+      log holds max_errors errors; ribx.complete is False if records were
+      left unparsed.
 
     """
+    if fail_fast:
+        max_errors = 1
+    if max_errors is not None:
+        if max_errors < 1:
+            raise ValueError("max_errors must be at least 1")
+        return _parse_budget(f, mode, stats, max_errors)
+
     parser = etree.XMLParser()
 
     try:
-        tree = etree.parse(f, parser)
+        with sources.open_stream(f) as stream:
+            if stats is None:
+                tree = etree.parse(stream, parser)
+            else:
+                with stats.phase('xml'):
+                    tree = etree.parse(stream, parser)
     except etree.XMLSyntaxError as e:
         logger.error(e)
-        return models.Ribx(), _log(parser)
+        return models.Ribx(), errors.ErrorLog(_log(parser))
 
     # At this point, the document is well formed.
 
     # Even if no exception was raised, the error log might not be empty: it may
     # contain warnings, for example. TODO: should these be returned as well?
 
-    error_log = _log(parser)
+    error_log = errors.ErrorLog(_log(parser))
 
     ribx = models.Ribx()
 
-    inspection_pipe_parser = TreeParser(
-        tree, models.InspectionPipe, mode, error_log)
-    cleaning_pipe_parser = TreeParser(
-        tree, models.CleaningPipe, mode, error_log)
-    drain_parser = TreeParser(
-        tree, models.Drain, mode, error_log)
-    inspection_manhole_parser = TreeParser(
-        tree, models.InspectionManhole, mode, error_log)
-    cleaning_manhole_parser = TreeParser(
-        tree, models.CleaningManhole, mode, error_log)
-
-    ribx.inspection_pipes = inspection_pipe_parser.elements()
-    ribx.cleaning_pipes = cleaning_pipe_parser.elements()
-    ribx.inspection_manholes = inspection_manhole_parser.elements()
-    ribx.cleaning_manholes = cleaning_manhole_parser.elements()
-    ribx.drains = drain_parser.elements()
+    tree_parser = TreeParser(tree, mode, error_log, stats)
+    if stats is None:
+        elements = tree_parser.elements()
+    else:
+        with stats.phase('elements'):
+            elements = tree_parser.elements()
+
+    for instance in elements:
+        ribx.add(instance)
+
+    return ribx, error_log
+
+
+def _parse_budget(f, mode, stats, max_errors):
+    """Streaming ``parse`` that stops once max_errors errors are logged."""
+    ribx = models.Ribx()
+    error_log = errors.ErrorLog()
+
+    with sources.open_stream(f, binary=True) as stream:
+        context = _iterparse_context(stream)
+        try:
+            for instance in _records(
+                    context, mode, error_log, stats, max_errors):
+                ribx.add(instance)
+        except etree.XMLSyntaxError as e:
+            # Like parse(): no elements from a document that isn't well
+            # formed.
+            logger.error(e)
+            error_log = errors.ErrorLog(_log(context)[:max_errors])
+            return models.Ribx(), error_log
+
+        if len(error_log) >= max_errors:
+            ribx.complete = _at_end(context)
+
+    return ribx, error_log
+
+
+def _at_end(context):
+    """Return whether an iterparse context has no records left that
+    parse would visit. A syntax error counts as something left."""
+    try:
+        return next(_root_records(context), None) is None
+    except etree.XMLSyntaxError:
+        return False
+
+
+def iterparse(f, mode, error_log=None, stats=None, max_errors=None,
+              fail_fast=False):
+    """Parse a GWSW.Ribx / GWSW.Ribx-A document incrementally.
+
+    Unlike ``parse``, the document is never held in memory as a whole: each
+    ZB_* record is parsed as soon as its end tag has been read, after which
+    its subtree is cleared. Memory use stays flat, regardless of the size of
+    the document. The same checks as in ``parse`` are done.
+
+    Args:
+      f (string): Full path to the file to be parsed, or a file object.
+      mode (Enum): See ribx.parsers.Mode.
+      error_log (ErrorLog): Optional ErrorLog to which parsing errors are
+        appended. A plain list gets dicts, and each error is logged.
+      stats (ParseStats): Optional, collects timings and counts; see
+        ribxlib.stats.
+      max_errors (int): Optional, stop as soon as this many errors have been
+        appended to the error log.
+      fail_fast (bool): Stop at the first error, i.e. max_errors=1.
+
+    Yields:
+      The SewerElement instances in the document, in document order. If the
+      document turns out not to be well formed halfway, iteration stops
+      and the syntax error is appended to the error log.
+
+    """
+    if error_log is None:
+        error_log = errors.ErrorLog()
+    if fail_fast:
+        max_errors = 1
+    if max_errors is not None and max_errors < 1:
+        raise ValueError("max_errors must be at least 1")
+
+    with sources.open_stream(f, binary=True) as stream:
+        context = _iterparse_context(stream)
+        try:
+            for instance in _records(
+                    context, mode, error_log, stats, max_errors):
+                yield instance
+        except etree.XMLSyntaxError as e:
+            logger.error(e)
+            error_log.extend(_log(context))
+
+
+def _iterparse_context(stream):
+    return etree.iterparse(stream, events=('end',), tag=list(models.MODELS))
+
+
+def _records(context, mode, error_log, stats, max_errors):
+    """Generate the SewerElements of the records (children of the root) in
+    an lxml iterparse context, clearing each record after parsing it. Stop
+    once max_errors (if not None) errors have been appended to error_log."""
+    if max_errors is not None:
+        max_errors += len(error_log)
+    events = _root_records(
+        context if stats is None else _timed_events(context, stats))
+    strings = {}  # See _intern
+
+    for event, node in events:
+        instance = _parse_node(
+            node, models.MODELS[node.tag], mode, error_log, stats,
+            strings=strings)
+        _clear(node)
+        if instance:
+            yield instance
+        if max_errors is not None and len(error_log) >= max_errors:
+            return
+
+
+def quick_scan(f):
+    """Summarize a document without parsing it.
+
+    The ZB_* start tags, inspection dates (?BF) and media (?BS of pipes and
+    manholes, N and M of observations) are found with a byte-level scan;
+    no models or geometries are built. The document isn't checked: records
+    that ``parse`` would reject are counted and their media included, and
+    dates that don't parse are left out of the range.
+
+    Args:
+      f (string): Full path to the file to be parsed, or a file object. It
+        may be compressed, see ``ribxlib.sources``.
+
+    Returns:
+      A Summary tuple.
+
+    """
+    counts = dict.fromkeys(models.MODELS, 0)
+    media = set()  # Bytes, decoded at the end
+    videos = set()  # Of observations, N
+    dates = set()
+
+    with sources.open_buffer(f) as data:
+        prefix = None  # Of the tags of the current record, e.g. b'A'
+        video = False
+        for tag, name, value in records.VALUE_RE.findall(data):
+            if tag:
+                tag = tag.decode('ascii')
+                counts[tag] += 1
+                prefix = tag[-1].encode('ascii')
+                video = models.MODELS[tag].has_video
+            elif name == b'M':
+                media.add(value)
+            elif name == b'N':
+                videos.add(value)
+            elif name[:1] == prefix:
+                if name.endswith(b'BF'):
+                    dates.add(value.strip())
+                elif video:
+                    media.add(value)
+
+        # Like the parser: N is a video filename with an optional '|'.
+        count = len(media)
+        texts = _texts(data, list(media) + list(videos))
+        media = set(text.strip() for text in texts[:count])
+        media.update(text.split('|')[0].strip() for text in texts[count:])
+
+    parsed = []
+    for date in dates:
+        try:
+            parsed.append(_parse_datetime(date.decode('ascii')).date())
+        except (ValueError, UnicodeDecodeError):
+            pass
+    return Summary(
+        counts, media,
+        min(parsed) if parsed else None, max(parsed) if parsed else None)
+
+
+def _texts(data, values):
+    """Return the text of values, the bytes between a start and end tag in
+    data: decoded and with references resolved, as lxml would. They are
+    parsed as children of the document's root, so that its XML declaration
+    (encoding) and DOCTYPE (entities) apply."""
+    try:
+        prolog = records.prolog(data)
+    except ValueError:
+        return [value.decode('utf-8', 'replace') for value in values]
+
+    def parse(values):
+        root = etree.fromstring(b''.join(
+            [prolog.data] + [b'<v>' + value + b'</v>' for value in values] +
+            [b'</' + prolog.root + b'>']))
+        return [child.text or '' for child in root]
+
+    try:
+        return parse(values)
+    except etree.XMLSyntaxError:
+        pass
+    # One at a time, to find the ones that can't be parsed.
+    texts = []
+    for value in values:
+        try:
+            texts.extend(parse([value]))
+        except etree.XMLSyntaxError:
+            texts.append(value.decode('utf-8', 'replace'))
+    return texts
+
+
+def parse_async(f, mode, error_log=None):
+    """Parse a document on an asyncio event loop, feeding it to the parser
+    in chunks. Requires Python 3.7+; see ``ribxlib.aio.parse_async``.
+
+    Returns:
+      An object that can be awaited for a (ribx, log) tuple, or iterated
+      with ``async for`` to get the elements one at a time.
+
+    """
+    from ribxlib import aio
+    return aio.parse_async(f, mode, error_log)
+
+
+def _root_records(events):
+    """Pass on the iterparse events of records that are children of the
+    root, the ones that TreeParser visits. Records nested deeper are left
+    alone; inside a record, they are part of it."""
+    for event, node in events:
+        parent = node.getparent()
+        if parent is not None and parent.getparent() is None:
+            yield event, node
+
+
+def _timed_events(context, stats):
+    """Pass on iterparse events, recording the time spent reading XML. The
+    phase is reported once, when iteration ends, with one call per event."""
+    seconds = 0.0
+    calls = 0
+    events = iter(context)
+    try:
+        while True:
+            start = timer()
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+            finally:
+                seconds += timer() - start
+            calls += 1
+            yield event
+    finally:
+        stats.add_phase('xml', seconds, calls)
+
+
+def parse_many(paths, mode, workers=None, ordered=True):
+    """Parse several documents, spread over a pool of worker processes.
+
+    Args:
+      paths (list): Full paths to the files to be parsed.
+      mode (Enum): See ribx.parsers.Mode.
+      workers (int): Number of processes, defaults to the number of CPUs.
+        With 1 worker, the files are parsed in this process.
+      ordered (bool): Yield the results in input order, or else as soon as
+        they are ready.
+
+    Yields:
+      (path, ribx, log) tuples, like ``parse`` returns for each path. An
+      unexpected error in one file (it can't be read, for instance) ends up
+      in the log of that file; it doesn't affect the others.
+
+    """
+    jobs = [(path, mode, geometry.get_backend()) for path in paths]
+
+    if workers == 1 or len(jobs) < 2:
+        for job in jobs:
+            yield _parse_job(job)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for result in imap(_parse_job, jobs):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _parse_job(job):
+    """Parse one file for parse_many; this runs in a worker process."""
+    path, mode, backend = job
+    geometry.set_backend(backend)
+    try:
+        ribx, error_log = parse(path, mode)
+    except Exception as e:
+        logger.exception("Parsing %s failed", path)
+        ribx = models.Ribx()
+        error_log = errors.ErrorLog([{'line': None, 'message': str(e)}])
+    return path, ribx, error_log
+
+
+def parse_parallel(f, mode, workers=None):
+    """Parse a GWSW.Ribx / GWSW.Ribx-A document using multiple processes.
+
+    The ZB_* records are located in the raw bytes, and chunks of them are
+    parsed in a pool of worker processes. Meanwhile, this process checks
+    that the document as a whole is well formed. The result is the same as
+    that of ``parse``, including the source lines of elements and errors.
+
+    Args:
+      f (string): Full path to the file to be parsed, or a file object.
+      mode (Enum): See ribx.parsers.Mode.
+      workers (int): Number of processes, defaults to the number of CPUs.
+        With 1 worker, the chunks are parsed in this process.
+
+    Returns:
+      A (ribx, log) tuple, see ``parse``.
+
+    """
+    with sources.open_buffer(f) as data:
+        return _parse_parallel(data, mode, workers)
+
+
+def _parse_parallel(data, mode, workers):
+    prolog = _prolog(data)
+    chunks = list(_chunks(records.scan(data))) if prolog else []
+    jobs = [(prolog, chunk, mode, geometry.get_backend()) for chunk in chunks]
+
+    if workers == 1 or len(data) < CHUNK_SIZE:
+        error_log, count = _check_well_formed(data)
+        if error_log is not None:
+            return models.Ribx(), error_log
+        results = [_parse_chunk(job) for job in jobs]
+    else:
+        # Checking well-formedness happens alongside the workers.
+        pool = multiprocessing.Pool(workers)
+        try:
+            async_results = pool.map_async(_parse_chunk, jobs)
+            error_log, count = _check_well_formed(data)
+            # Wait for the workers even if the document isn't well formed:
+            # terminating a pool that is still handing out tasks can hang.
+            results = async_results.get()
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        if error_log is not None:
+            return models.Ribx(), error_log
+
+    if not _scanned_all(chunks, count, results):
+        return _parse_data(data, mode)
+
+    ribx = models.Ribx()
+    error_log = errors.ErrorLog()
+    for instances, chunk_error_log in results:
+        for instance in instances:
+            if instance:
+                ribx.add(instance)
+        error_log.extend(chunk_error_log)
 
     return ribx, error_log
 
 
+def reparse(previous, f, mode):
+    """Parse a revised version of a document, reusing a previous result.
+
+    The ZB_* records of the document are hashed; only records that weren't
+    in the previous version are parsed. Elements of unchanged records are
+    taken over from the previous result; those of records that moved are
+    copied, with updated source lines. The previous result isn't changed,
+    but it shares elements with the new one.
+
+    If the records can't be found in the bytes (see ``parse_parallel``), the
+    whole document is parsed, and the changes are found by comparing refs:
+    refs in both versions are then reported as changed.
+
+    Args:
+      previous (Ribx): The result of an earlier ``reparse``, or None. Results
+        of other parse functions don't have the record hashes that are
+        needed, so then the whole document is parsed.
+      f (string): Full path to the file to be parsed, or a file object.
+      mode (Enum): See ribx.parsers.Mode.
+
+    Returns:
+      A (ribx, changes, log) tuple. The ribx is the same as ``parse`` would
+      return. Changes is a Changes tuple with lists of the refs of added,
+      removed and changed elements. Log only contains the parsing errors in
+      added or changed records.
+
+    """
+    with sources.open_buffer(f) as data:
+        return _reparse(previous, data, mode)
+
+
+def _reparse(previous, data, mode):
+    error_log, count = _check_well_formed(data)
+    if error_log is not None:
+        return models.Ribx(), Changes([], [], []), error_log
+
+    prolog = _prolog(data)
+    scanned_records = list(records.scan(data)) if prolog else []
+    if len(scanned_records) != count:
+        return _reparse_all(previous, data, mode)
+
+    # Digest -> (line, ref, element) tuples of the previous records with
+    # that content, in document order.
+    available = {}
+    if previous is not None and previous.records:
+        for digest, entries in previous.records.items():
+            available[digest] = list(entries)
+
+    scanned = []  # (digest, record, reused entry or None) per record
+    to_parse = []
+
+    for record in scanned_records:
+        digest = _digest(record, mode)
+        if available.get(digest):
+            scanned.append((digest, record, available[digest].pop(0)))
+        else:
+            scanned.append((digest, record, None))
+            to_parse.append(record)
+
+    result = _parse_chunk((prolog, to_parse, mode, geometry.get_backend()))
+    if result is None:
+        return _reparse_all(previous, data, mode)
+    instances, error_log = result
+    instances = iter(instances)
+
+    ribx = models.Ribx()
+    ribx.records = {}
+    parsed_refs = []
+
+    for digest, record, entry in scanned:
+        if entry is None:
+            element = next(instances)
+            ref = element.ref if element else _record_ref(prolog, record)
+            parsed_refs.append(ref)
+        else:
+            line, ref, element = entry
+            if element and record.line != line:
+                element = _moved(element, record.line - line)
+        if element:
+            ribx.add(element)
+        ribx.records.setdefault(digest, []).append(
+            (record.line, ref, element))
+
+    removed_refs = [ref for entries in available.values()
+                    for line, ref, element in entries]
+    return ribx, _changes(parsed_refs, removed_refs), error_log
+
+
+def _reparse_all(previous, data, mode):
+    """Reparse by parsing the whole document with ``parse``. The result
+    has no record hashes, so a next reparse parses everything too."""
+    ribx, error_log = _parse_data(data, mode)
+    old_refs = [] if previous is None else _unique(
+        element.ref for element in previous.elements())
+    new_refs = _unique(element.ref for element in ribx.elements())
+    old, new = set(old_refs), set(new_refs)
+    changes = Changes(
+        added=[ref for ref in new_refs if ref not in old],
+        removed=[ref for ref in old_refs if ref not in new],
+        changed=[ref for ref in new_refs if ref in old],
+    )
+    return ribx, changes, error_log
+
+
+def _moved(element, offset):
+    """Return a copy of a reused element with its source lines shifted, so
+    that the previous result keeps its own."""
+    element = copy.copy(element)
+    if element._media is not None:
+        element._media = set(element._media)
+    if isinstance(element, models.Pipe):
+        element.manhole1 = copy.copy(element.manhole1)
+        element.manhole2 = copy.copy(element.manhole2)
+    _shift_sourcelines(element, offset)
+    return element
+
+
+def _digest(record, mode):
+    """Return a hash of the record's content (and the mode it is parsed
+    in)."""
+    return hashlib.sha1(mode.name.encode('ascii') + record.data).digest()
+
+
+def _record_ref(prolog, record):
+    """Return the ?AA ref of a record that couldn't be parsed, if any."""
+    try:
+        node = etree.fromstring(records.wrap(prolog, [record]))[0]
+        return ElementParser(
+            node, models.MODELS[node.tag], None).tag_value('AA')[0]
+    except Exception:
+        return None
+
+
+def _changes(parsed_refs, removed_refs):
+    """Return a Changes tuple. A ref is changed if records with it were
+    both parsed and removed, otherwise it was added or removed."""
+    changed = set(parsed_refs) & set(removed_refs)
+    return Changes(
+        added=_unique(ref for ref in parsed_refs if ref not in changed),
+        removed=_unique(ref for ref in removed_refs if ref not in changed),
+        changed=_unique(ref for ref in parsed_refs if ref in changed),
+    )
+
+
+def _unique(refs):
+    seen = set()
+    return [ref for ref in refs if not (ref in seen or seen.add(ref))]
+
+
+def _chunks(scanned_records):
+    """Group records into chunks of about CHUNK_SIZE bytes."""
+    chunk = []
+    size = 0
+    for record in scanned_records:
+        chunk.append(record)
+        size += len(record.data)
+        if size >= CHUNK_SIZE:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+
+
+def _check_well_formed(data):
+    """Return a (log, count) tuple. Log is None if data is well formed,
+    otherwise the error log that ``parse`` would return. Count is the
+    number of ZB_* records among the children of the root. No tree is
+    built."""
+    parser = etree.XMLParser(target=_RecordCounter())
+    try:
+        # Fed in parts, as data may be an mmap. An empty document must be
+        # fed too, to get the same error as parse.
+        for start in range(0, max(len(data), 1), sources.READ_SIZE):
+            parser.feed(data[start:start + sources.READ_SIZE])
+        return None, parser.close()
+    except etree.XMLSyntaxError as e:
+        logger.error(e)
+        return errors.ErrorLog(_log_entries(parser.feed_error_log)), 0
+
+
+class _RecordCounter(object):
+    """Parser target that counts the ZB_* children of the root."""
+
+    def __init__(self):
+        self.depth = 0
+        self.count = 0
+
+    def start(self, tag, attrib):
+        self.depth += 1
+        if self.depth == 2 and tag in models.MODELS:
+            self.count += 1
+
+    def end(self, tag):
+        self.depth -= 1
+
+    def close(self):
+        return self.count
+
+
+def _prolog(data):
+    """Return the Prolog of data, or None if the byte scan can't find it
+    (e.g. UTF-16, or there is no root element)."""
+    try:
+        return records.prolog(data)
+    except ValueError:
+        return None
+
+
+def _scanned_all(chunks, count, results):
+    """Return whether the records found by the byte scan are the ones that
+    parse would find: count ZB_* children of the root, which could all be
+    parsed on their own. They aren't if the root has a default namespace,
+    or if records are in comments, in CDATA or deeper in the tree, for
+    instance."""
+    return (sum(len(chunk) for chunk in chunks) == count and
+            all(result is not None for result in results))
+
+
+def _parse_data(data, mode):
+    """Parse a buffer with ``parse``."""
+    return parse(io.BytesIO(data[:]), mode)
+
+
+def _parse_chunk(job):
+    """Parse a chunk of records for parse_parallel; this runs in a worker
+    process. Source lines are shifted to match the original document.
+
+    Returns None if the records don't parse as the root's children they
+    were scanned as, see _scanned_all.
+
+    """
+    prolog, chunk, mode, backend = job
+    geometry.set_backend(backend)
+    if not chunk:
+        return [], errors.ErrorLog()
+    try:
+        root = etree.fromstring(records.wrap(prolog, chunk))
+    except etree.XMLSyntaxError:
+        return None
+    if [node.tag for node in root] != [record.tag for record in chunk]:
+        return None
+
+    instances = []  # One per record, None if it couldn't be parsed
+    error_log = errors.ErrorLog()
+    strings = {}  # See _intern
+    # Where the record starts in the wrapped document
+    line = prolog.data.count(b'\n') + 1
+    for record, node in zip(chunk, root):
+        offset = record.line - line
+        line += record.data.count(b'\n')
+
+        instance = _parse_node(
+            node, models.MODELS[node.tag], mode, error_log,
+            line_offset=offset, strings=strings)
+        if instance:
+            _shift_sourcelines(instance, offset)
+        instances.append(instance)
+
+    return instances, error_log
+
+
+def _shift_sourcelines(instance, offset):
+    instance.sourceline += offset
+    if isinstance(instance, models.Pipe):
+        instance.manhole1.sourceline += offset
+        instance.manhole2.sourceline += offset
+
+
+def _parse_node(node, model, mode, error_log, stats=None, line_offset=0,
+                strings=None):
+    """Return a SewerElement for node, or None if parsing failed; in that
+    case the problem is appended to the error log, with line_offset added to
+    its line. Repeated strings are shared through the strings table of the
+    parse, see _intern."""
+    if stats is None:
+        element_parser = ElementParser(node, model, mode, strings)
+    else:
+        element_parser = stats.instrument(
+            ElementParser, INSTRUMENTED_METHODS)(node, model, mode, strings)
+    try:
+        instance = element_parser.parse()
+    except Exception as e:
+        _log2(node, element_parser.expr, e, error_log, line_offset)
+        instance = None
+    if stats is not None:
+        stats.count(node.tag, ok=instance is not None)
+    return instance
+
+
+def _clear(node):
+    """Free a node that has been parsed, and everything before it."""
+    node.clear()
+    while node.getprevious() is not None:
+        del node.getparent()[0]
+
+
+def _parse_datetime(datestr, timestr=None):
+    """Return the datetime of a RIBX date (YYYY-MM-DD) and optional time
+    (HH:MM:SS).
+
+    Equivalent to ``datetime.strptime()`` with "%Y-%m-%d %H:%M:%S" or
+    "%Y-%m-%d", but the fixed formats are matched directly and the results
+    are memoized. Anything else, including invalid dates, is handed to
+    strptime, so it raises the same ValueErrors.
+
+    """
+    key = (datestr, timestr)
+    result = _datetime_cache.get(key)
+    if result is not None:
+        return result
+
+    date_match = _DATE_RE.match(datestr)
+    time_match = _TIME_RE.match(timestr) if timestr else None
+    try:
+        if date_match and (time_match or not timestr):
+            fields = date_match.groups()
+            if time_match:
+                fields += time_match.groups()
+            result = datetime(*map(int, fields))
+    except ValueError:
+        result = None  # E.g. month 13: let strptime raise the error
+
+    if result is None:
+        if timestr:
+            result = datetime.strptime(
+                '{} {}'.format(datestr, timestr), "%Y-%m-%d %H:%M:%S")
+        else:
+            result = datetime.strptime(datestr, "%Y-%m-%d")
+
+    if len(_datetime_cache) >= DATETIME_CACHE_SIZE:
+        _datetime_cache.clear()
+    _datetime_cache[key] = result
+    return result
+
+
+def _intern(strings, string):
+    """Return an earlier, equal string from the strings table if there is
+    one. A manhole ref occurs in every pipe that connects to it; the
+    elements can share one string object instead of a copy each.
+
+    Every parse has a table of its own, which is dropped when the parse is
+    done; the elements keep sharing the strings.
+
+    """
+    if string is None:
+        return None
+    result = strings.get(string)
+    if result is None:
+        if len(strings) >= INTERN_SIZE:
+            strings.clear()
+        result = strings[string] = string
+    return result
+
+
 def _log(parser, level=etree.ErrorLevels.FATAL):
     """Return a list of parser errors.
 
     """
+    return _log_entries(parser.error_log, level)
+
+
+def _log_entries(error_log, level=etree.ErrorLevels.FATAL):
+    """Return a list of the errors in an lxml error log."""
     return [{
         'column': error.column,
         'level': error.level_name,
         'line': error.line,
         'message': error.message,
-    } for error in parser.error_log.filter_from_level(level)]
+    } for error in error_log.filter_from_level(level)]
 
 
-def _log2(node, expr, e, error_log):
-    """Append to a list of parser errors.
+def _log2(node, expr, e, error_log, line_offset=0):
+    """Append to a list of parser errors: an ErrorLog, or a list, which gets
+    a dict.
 
     """
-    message = "Element {} has problems with {}: {}".format(node.tag, expr, e)
-    error_log.append({'line': node.sourceline, 'message': message})
-    logger.error(message)
+    record = errors.ErrorRecord.from_exception(
+        node.tag, expr, node.sourceline + line_offset, e)
+    if isinstance(error_log, errors.ErrorLog):
+        error_log.report(record)
+    else:
+        error_log.append(record.as_dict())
+        logger.error('%s', record)
 
 
 class TreeParser(object):
-    """Parser for any kind of thing (Pipe / Manhole / Drain); all the tags
-    work very similarly, except for different prefixes.
+    """Parser for all kinds of things (Pipe / Manhole / Drain) in a tree.
+
+    The ZB_* records are children of the root. They are visited in one pass,
+    and each is handed to an ElementParser for the model registered for its
+    tag; all the tags work very similarly, except for different prefixes.
 
     """
 
-    def __init__(self, tree, model, mode, error_log):
+    def __init__(self, tree, mode, error_log, stats=None):
         self.tree = tree
-        self.model = model
         self.mode = mode
         self.error_log = error_log
+        self.stats = stats
+        self.strings = {}  # See _intern
 
     def elements(self):
-        """Return all SewerElement model instances that are in the tree."""
+        """Return all SewerElement model instances that are in the tree,
+        in document order."""
         elements = []
 
-        nodes = self.tree.xpath('//{}'.format(self.model.tag), namespaces=NS)
-
-        for node in nodes:
-            element_parser = ElementParser(node, self.model, self.mode)
-            try:
-                instance = element_parser.parse()
-                if instance:
-                    elements.append(instance)
-            except Exception as e:
-                _log2(node, element_parser.expr, e, self.error_log)
+        for node in self.tree.getroot():
+            model = models.MODELS.get(node.tag)
+            if model is None:
+                continue  # ZA header, comments, ...
+            instance = _parse_node(
+                node, model, self.mode, self.error_log, self.stats,
+                strings=self.strings)
+            if instance:
+                elements.append(instance)
 
         return elements
 
 
 class ElementParser(object):
-    """Parse an individual node."""
-    def __init__(self, node, model, mode):
+    """Parse an individual node. Repeated strings are shared through the
+    strings table, if one is given; see _intern."""
+    def __init__(self, node, model, mode, strings=None):
         self.node = node
         self.model = model
         self.mode = mode
+        self.strings = {} if strings is None else strings
 
         self.expr = ''  # Keep it around so we can log it in case of error
 
+    @property
+    def node(self):
+        return self._node
+
+    @node.setter
+    def node(self, node):
+        self._node = node
+        self._children = None  # Tag -> child nodes, built on first lookup
+
     def xpath(self, expr):
+        """Evaluate any XPath expression on the node. The field lookups use
+        the faster ``children`` instead."""
         self.expr = expr
         return self.node.xpath(expr, namespaces=NS)
 
+    def children(self, tag):
+        """Return the child nodes with this tag, in document order.
+
+        All field lookups are answered from an index of the node's children
+        that is built in one pass, instead of evaluating XPath per field.
+
+        """
+        self.expr = tag
+        if self._children is None:
+            self._children = {}
+            for child in self._node:
+                self._children.setdefault(child.tag, []).append(child)
+        return self._children.get(tag, [])
+
     def tag(self, name):
         return self.model.tag[-1] + name
 
     def parse(self):
         # ?AA: reference
         item_ref, item_sourceline = self.tag_value('AA', complain=True)
+        if issubclass(self.model, models.Manhole):
+            item_ref = _intern(self.strings, item_ref)
         instance = self.model(item_ref)
         instance.sourceline = item_sourceline
 
@@ -164,13 +976,15 @@ class ElementParser(object):
             # We need two manholes and two sets of coordinates.
             manhole1_ref, manhole1_sourceline = self.tag_value(
                 'AD', complain=True)
-            instance.manhole1 = models.Manhole(manhole1_ref)
+            instance.manhole1 = models.Manhole(
+                _intern(self.strings, manhole1_ref))
             instance.manhole1.sourceline = manhole1_sourceline
             instance.manhole1.geom = self.tag_point('AE')
 
             manhole2_ref, manhole2_sourceline = self.tag_value(
                 'AF', complain=True)
-            instance.manhole2 = models.Manhole(manhole2_ref)
+            instance.manhole2 = models.Manhole(
+                _intern(self.strings, manhole2_ref))
             instance.manhole2.sourceline = manhole2_sourceline
             instance.manhole2.geom = self.tag_point('AG')
 
@@ -189,55 +1003,66 @@ class ElementParser(object):
             instance.geom = self.tag_point('AB')
 
         # ?AQ: Ownership
-        instance.owner = self.tag_value('AQ')[0]
+        instance.owner = _intern(self.strings, self.tag_value('AQ')[0])
 
         if self.model.has_video:
-            instance.media.update(self.get_video())
+            instance.add_media(self.get_video())
 
         # Maybe inspection / cleaning wasn't possible
         instance.work_impossible = self.get_work_impossible()
 
         # If a *XC tag exists, this element was new, not planned
         # *XC = "Ontbreekt in opracht"
-        if self.xpath(self.tag('XC')):
+        if self.children(self.tag('XC')):
             instance.new = True
 
-        # ZC nodes
-        for observation in self.get_observations():
-            instance.media.update(observation.media())
+        # ZC nodes, each is turned into one Observation
+        observations = self.get_observations()
+        for observation in observations:
+            instance.add_media(observation.media())
 
         if issubclass(self.model, models.InspectionPipe):
-            for observation in self.get_observations():
-                instance.observations.append(observation)
+            instance.observations.extend(observations)
 
         # All well...
         return instance
 
     def tag_value(self, name, complain=False):
-        items = self.xpath(self.tag(name))
+        items = self.children(self.tag(name))
         if not items:
             if complain:
-                raise models.ParseException(
-                    "Expected {} record".format(self.tag(name)))
+                raise errors.RecordError('missing', self.tag(name))
             else:
                 return None, None
         item = items[0]
         return item.text.strip(), item.sourceline
 
     def tag_attribute(self, name, attribute):
-        item = self.xpath('{}/@{}'.format(self.tag(name), self.tag(attribute)))
-        if item:
-            return item[0]
+        items = self.children(self.tag(name))
+        self.expr = '{}/@{}'.format(self.tag(name), self.tag(attribute))
+        for item in items:
+            value = item.get(self.tag(attribute))
+            if value is not None:
+                return value
 
     def tag_point(self, name):
         """Interpret tag contents as gml:Point and return geom"""
-        node_set = self.xpath('{}/gml:Point/gml:pos'.format(self.tag(name)))
-
-        if node_set:
-            coordinates = map(float, node_set[0].text.split())
-            point = ogr.Geometry(ogr.wkbPoint)
-            point.AddPoint(*coordinates)
-            return point
+        items = self.children(self.tag(name))
+        self.expr = '{}/gml:Point/gml:pos'.format(self.tag(name))
+
+        for pos in self._gml_pos(items):
+            coordinates = [float(c) for c in pos.text.split()]
+            return geometry.make_point(*coordinates)
+
+    @staticmethod
+    def _gml_pos(items):
+        """Generate the gml:Point/gml:pos grandchildren of items."""
+        for item in items:
+            for point in item:
+                if point.tag == GML_POINT:
+                    for pos in point:
+                        if pos.tag == GML_POS:
+                            yield pos
 
     def get_manhole_start(self, instance):
         """Return a manhole ref that references the starting manhole of
@@ -246,15 +1071,12 @@ class ElementParser(object):
         manhole_start_ref, manhole_start_sourceline = self.tag_value('AB')
         if (manhole_start_ref and manhole_start_ref not in
                 [instance.manhole1.ref, instance.manhole2.ref]):
-            raise Exception(
-                "manhole_start {} doesn't correspond to either manhole1 {} or "
-                "manhole2 {} of the pipe.".format(manhole_start_ref,
-                                                  instance.manhole1.ref,
-                                                  instance.manhole2.ref))
+            raise errors.RecordError(
+                'manhole_start_mismatch', manhole_start_ref,
+                instance.manhole1.ref, instance.manhole2.ref)
 
         if not manhole_start_ref:
-            raise Exception("Inspection start node for pipes must be present. "
-                            "Current mode: {}".format(self.mode))
+            raise errors.RecordError('manhole_start_missing', self.mode)
         return manhole_start_ref
 
     def get_work_impossible(self):
@@ -270,18 +1092,15 @@ class ElementParser(object):
             }.get(xd, None)
 
             if xd_explanation is None:
-                raise Exception('Onbekende {}XD code "{}"'.format(
-                    self.tag('XD'), xd))
+                raise errors.RecordError('unknown_xd', self.tag('XD'), xd)
 
             attr_explanation = self.tag_attribute('XD', 'DE') or ''
             if xd == 'Z' and not attr_explanation:
-                raise Exception(
-                    'Expected explanation for Z code in {} tag'
-                    .format(self.tag('DE')))
+                raise errors.RecordError(
+                    'explanation_missing', self.tag('DE'))
             elif xd != 'Z' and attr_explanation:
-                raise Exception(
-                    'Explanation in {} tag not allowed without Z code.'
-                    .format(self.tag('DE')))
+                raise errors.RecordError(
+                    'explanation_not_allowed', self.tag('DE'))
 
             tag_explanation, sourceline = self.tag_value('DE')
 
@@ -298,19 +1117,16 @@ class ElementParser(object):
         Occurrence: 0 for pre-inspection
         Occurrence: 1 for inspection
         """
-        node_set = self.xpath(self.tag('BF'))
+        node_set = self.children(self.tag('BF'))
 
         if self.mode == Mode.PREINSPECTION and len(node_set) != 0:
-            msg = "maxOccurs = 0 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('max_occurs', 0, self.mode)
 
         if self.mode == Mode.INSPECTION and len(node_set) < 1:
-            msg = "minOccurs = 1 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('min_occurs', 1, self.mode)
 
         if self.mode == Mode.INSPECTION and len(node_set) > 1:
-            msg = "maxOccurs = 1 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('max_occurs', 1, self.mode)
 
         if self.mode == Mode.INSPECTION:
             return node_set[0].text.strip()
@@ -328,11 +1144,10 @@ class ElementParser(object):
         Occurrence: 0 for pre-inspection
         Occurrence: 0..1 for inspection
         """
-        node_set = self.xpath(self.tag('BG'))
+        node_set = self.children(self.tag('BG'))
 
         if self.mode == Mode.PREINSPECTION and len(node_set) != 0:
-            msg = "maxOccurs = 0 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('max_occurs', 0, self.mode)
         if self.mode == Mode.INSPECTION and len(node_set) > 0:
             return node_set[0].text.strip()
         return None
@@ -343,26 +1158,21 @@ class ElementParser(object):
         ``get_inspection_date_as_string``."""
         datestr = self.get_inspection_date_as_string()
         timestr = self.get_inspection_time_as_string()
-        if timestr and datestr:
-            return datetime.strptime(
-                '{} {}'.format(datestr, timestr), "%Y-%m-%d %H:%M:%S")
         if datestr:
-            return datetime.strptime(datestr, "%Y-%m-%d")
+            return _parse_datetime(datestr, timestr)
         return None
 
     def get_video(self):
         # ?BS: file name of video
         # Occurrence: 0 for pre-inspection
         # Occurrence: 0..1 for inspection
-        node_set = self.xpath(self.tag('BS'))
+        node_set = self.children(self.tag('BS'))
 
         if self.mode == Mode.PREINSPECTION and len(node_set) != 0:
-            msg = "maxOccurs = 0 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('max_occurs', 0, self.mode)
 
         if self.mode == Mode.INSPECTION and len(node_set) > 1:
-            msg = "maxOccurs = 1 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('max_occurs', 1, self.mode)
 
         if node_set:
             video = node_set[0].text.strip()
@@ -375,11 +1185,9 @@ class ElementParser(object):
         # ZC: observation
         # Occurrence: 0 for pre-inspection
         # Occurrence: * for inspection
-        node_set = self.xpath('ZC')
+        node_set = self.children('ZC')
 
         if self.mode == Mode.PREINSPECTION and len(node_set) != 0:
-            msg = "maxOccurs = 0 in {}".format(self.mode)
-            raise Exception(msg)
+            raise errors.RecordError('max_occurs', 0, self.mode)
 
-        for zc_node in node_set:
-            yield models.Observation(zc_node)
+        return [models.Observation(zc_node) for zc_node in node_set]
@@ -0,0 +1,90 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Byte-level scanning of the ZB_* records in a RIBX document.
+
+The records are found without parsing the XML, so that they can be parsed
+separately (in parallel, for instance). Records can be turned into a small
+document of their own with ``wrap``; their line numbers then need to be
+shifted to match the original document.
+
+The scanner assumes a sane document: ZB_* start and end tags that appear in
+comments or CDATA sections are not recognized as such.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import namedtuple
+import re
+
+from ribxlib import models
+
+# A record: its tag, the offsets of its bytes in the document, the line it
+# starts on and its bytes.
+Record = namedtuple('Record', ['tag', 'start', 'end', 'line', 'data'])
+
+RECORD_RE = re.compile(
+    br'<(' + b'|'.join(tag.encode('ascii') for tag in sorted(models.MODELS)) +
+    br')\b(?:[^>]*?/>|.*?</\1\s*>)', re.S)
+
+# What parsers.quick_scan looks at: the start tags of records, and the ?BF
+# (inspection date) and ?BS (video) of records and N (video) and M (photo)
+# of observations, with their text.
+VALUE_RE = re.compile(
+    br'<(' + b'|'.join(tag.encode('ascii') for tag in sorted(models.MODELS)) +
+    br')\b|<([A-Z]B[FS]|[NM])>([^<]*)</\2\s*>')
+
+# Everything before the first record that's needed to parse records on
+# their own: the XML declaration, DOCTYPE (entities!) and the start tag of the
+# root element, verbatim. Its tag is needed to close the root again.
+Prolog = namedtuple('Prolog', ['data', 'root'])
+
+# Things that may come before the root element.
+PROLOG_RE = re.compile(
+    br'\s*(?:<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>\[]*(?:\[.*?\])?\s*>)', re.S)
+START_TAG_RE = re.compile(br'\s*<([^\s/>]+)[^>]*>')
+
+
+def scan(data):
+    """Generate the ZB_* records in data (bytes, or a buffer such as an
+    mmap), in document order."""
+    position = 0
+    line = 1
+    for match in RECORD_RE.finditer(data):
+        start, end = match.span()
+        line += data[position:start].count(b'\n')
+        record = match.group(0)
+        yield Record(match.group(1).decode('ascii'), start, end, line, record)
+        line += record.count(b'\n')
+        position = end
+
+
+def prolog(data):
+    """Return the Prolog to put in front of records to make them a document.
+
+    Raises ValueError if there is no root element; check that the document is
+    well formed first.
+
+    """
+    position = 0
+    match = PROLOG_RE.match(data, position)
+    while match and match.end() > position:
+        position = match.end()
+        match = PROLOG_RE.match(data, position)
+
+    root = START_TAG_RE.match(data, position)
+    if root is None:
+        raise ValueError("No root element found")
+
+    return Prolog(bytes(data[:root.end()]), root.group(1))
+
+
+def wrap(prolog, records):
+    """Return a document with the records as children of the root. The
+    first record starts on line ``prolog.data.count(b'\\n') + 1``."""
+    return b''.join(
+        [prolog.data] + [record.data for record in records] +
+        [b'</' + prolog.root + b'>'])
@@ -6,8 +6,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import argparse
 import logging
-import sys
 
 from ribxlib import parsers
 
@@ -21,19 +21,34 @@ POSSIBLE_ITEM_LISTS = ['inspection_pipes',
                    ]
 
 
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Print the info parsed from .ribx files.")
+    parser.add_argument('filenames', metavar='filename', nargs='+',
+                        help="ribx file(s), parsed in 'inspection' mode; they "
+                        "may be gzip or zip compressed")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="parse the files in parallel with this many "
+                        "processes (default: 1)")
+    return parser
+
+
 def main():
     logging.basicConfig(level=logging.INFO)
-    if len(sys.argv) < 2:
-        logger.critical("Pass in a ribx filename")
-        sys.exit(1)
+    args = get_parser().parse_args()
+
+    results = parsers.parse_many(
+        args.filenames, parsers.Mode.INSPECTION, workers=args.workers)
 
-    filename = sys.argv[1]
-    logger.info("Reading %s (in 'inspection' mode)", filename)
+    for filename, ribx, error_log in results:
+        logger.info("Read %s (in 'inspection' mode)", filename)
+        if error_log:
+            logger.error("Error log found:\n%s",
+                         "\n".join(error_log.summary()))
+        print_ribx(ribx)
 
-    ribx, error_log = parsers.parse(open(filename), parsers.Mode.INSPECTION)
-    if error_log:
-        logger.error("Error log found:\n%s", error_log)
 
+def print_ribx(ribx):
     for item_list_name in POSSIBLE_ITEM_LISTS:
         item_list = getattr(ribx, item_list_name)
         title = "%s: %s items" % (item_list_name, len(item_list))
@@ -0,0 +1,178 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Input of RIBX documents: plain, gzip or zip compressed.
+
+Compression is recognized by the first bytes, not the file name, so
+uploads don't need a particular extension. A zip file must contain one
+document: its only member, or the only member ending in ``.ribx``.
+
+``open_stream`` gives a binary file object for the parsers that read
+sequentially; compressed input is decompressed while it is read.
+``open_buffer`` gives the whole document as a buffer for the record
+scanners: an uncompressed file is memory-mapped instead of read into
+memory, so its bytes are only copied for the records that are parsed.
+
+Text mode file objects are accepted too, as lxml accepts them. They are
+never decompressed or memory-mapped. Where bytes are needed, the text is
+encoded as UTF-8 and the encoding in its XML declaration replaced.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+import gzip
+import io
+import mmap
+import re
+import shutil
+import zipfile
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+# Number of bytes that is read or fed to a parser at a time.
+READ_SIZE = 1 << 16
+
+# The encoding in an XML declaration, in text.
+DECLARED_ENCODING_RE = re.compile(
+    r"""^(\s*<\?xml[^>]*?\bencoding\s*=\s*)(["'])[^"']*\2""")
+
+
+def compression(fileobj):
+    """Return 'gzip', 'zip' or None for a file object, by its first bytes.
+    The file position is left unchanged, so it must be seekable. A text
+    mode file object isn't compressed."""
+    position = fileobj.tell()
+    magic = fileobj.read(4)
+    fileobj.seek(position)
+    if not isinstance(magic, bytes):
+        return None
+    if magic.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if magic.startswith(ZIP_MAGIC):
+        return 'zip'
+    return None
+
+
+@contextmanager
+def open_stream(f, binary=False):
+    """Return a binary file object with the (decompressed) document.
+
+    Args:
+      f: Full path to the file, or a file object. File objects that can't
+        seek are read into memory first.
+      binary (bool): Whether a text mode file object must be converted to
+        bytes (see ``encode``); otherwise it is returned as it is.
+
+    """
+    with _open(f) as fileobj:
+        if _is_text(fileobj):
+            yield io.BytesIO(encode(fileobj.read())) if binary else fileobj
+            return
+        kind = compression(fileobj)
+        if kind == 'gzip':
+            with gzip.GzipFile(fileobj=fileobj, mode='rb') as stream:
+                yield stream
+        elif kind == 'zip':
+            with zipfile.ZipFile(fileobj) as archive:
+                with archive.open(_member(archive)) as stream:
+                    yield stream
+        else:
+            yield fileobj
+
+
+@contextmanager
+def open_buffer(f):
+    """Return the whole (decompressed) document as bytes or an mmap, which
+    can be sliced and searched like bytes. An mmap is closed on exit.
+
+    Args:
+      f: Full path to the file, or a file object.
+
+    """
+    with _open(f) as fileobj:
+        if _is_text(fileobj):
+            yield encode(fileobj.read())
+            return
+        if compression(fileobj) is None:
+            buffer = _mmap(fileobj)
+            if buffer is not None:
+                try:
+                    yield buffer
+                finally:
+                    buffer.close()
+                return
+        with open_stream(fileobj) as stream:
+            data = io.BytesIO()
+            shutil.copyfileobj(stream, data, READ_SIZE)
+            yield data.getvalue()
+
+
+@contextmanager
+def _open(f):
+    """Return a seekable binary file object for a path or file object."""
+    if not hasattr(f, 'read'):
+        with open(f, 'rb') as fileobj:
+            yield fileobj
+    elif _seekable(f):
+        yield f
+    else:
+        data = f.read()
+        if isinstance(data, bytes):
+            yield io.BytesIO(data)
+        else:
+            yield io.StringIO(data)
+
+
+def encode(text):
+    """Return a document read in text mode as UTF-8 bytes, with UTF-8 as
+    the encoding in its XML declaration."""
+    text = DECLARED_ENCODING_RE.sub(
+        r'\1\2UTF-8\2', text.lstrip('\ufeff'), 1)
+    return text.encode('utf-8')
+
+
+def _is_text(fileobj):
+    return not isinstance(fileobj.read(0), bytes)
+
+
+def _seekable(fileobj):
+    if hasattr(fileobj, 'seekable'):
+        return fileobj.seekable()
+    try:
+        fileobj.seek(fileobj.tell())
+    except (AttributeError, IOError):
+        return False
+    return True
+
+
+def _mmap(fileobj):
+    """Return an mmap of a real file that is read from the start, or
+    None."""
+    try:
+        fileno = fileobj.fileno()
+    except (AttributeError, IOError, ValueError):
+        return None  # E.g. BytesIO
+    if fileobj.tell() != 0:
+        return None
+    try:
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (ValueError, mmap.error):
+        return None  # E.g. an empty file
+
+
+def _member(archive):
+    """Return the name of the document in a zip archive."""
+    names = [info.filename for info in archive.infolist()
+             if not info.filename.endswith('/')]
+    if len(names) != 1:
+        names = [name for name in names if name.lower().endswith('.ribx')]
+    if len(names) != 1:
+        raise ValueError(
+            "Expected one RIBX document in the zip file, found {}".format(
+                len(names)))
+    return names[0]
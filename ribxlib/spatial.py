@@ -0,0 +1,194 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Spatial index over the elements of a parsed Ribx.
+
+Manholes and drains are indexed as points, pipes as line segments between
+their manholes. The index is an R-tree packed with the Sort-Tile-Recursive
+(STR) algorithm, stored as NumPy arrays and queried one level at a time, so
+large networks don't need any per-element Python work. NumPy is an optional
+dependency; it is only needed for this module.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import math
+
+import numpy as np
+
+from ribxlib import models
+
+NODE_SIZE = 16
+
+
+class SpatialIndex(object):
+    """Bounding box, radius and nearest neighbour queries on elements.
+
+    Elements without (complete) coordinates are not indexed. Query results
+    are lists of elements; ``types`` optionally restricts them to instances
+    of a model class (or tuple of classes), e.g. ``models.Manhole``.
+
+    """
+
+    def __init__(self, elements, node_size=NODE_SIZE):
+        items = []
+        coords = []
+        for element in elements:
+            segment = _segment(element)
+            if segment is not None:
+                items.append(element)
+                coords.append(segment)
+
+        coords = np.array(coords, dtype=float).reshape(-1, 4)
+        bounds = np.column_stack([
+            np.minimum(coords[:, 0], coords[:, 2]),
+            np.minimum(coords[:, 1], coords[:, 3]),
+            np.maximum(coords[:, 0], coords[:, 2]),
+            np.maximum(coords[:, 1], coords[:, 3]),
+        ])
+
+        order = _str_order(bounds, node_size)
+        self.items = [items[i] for i in order]
+        self.coords = coords[order]  # x1, y1, x2, y2 per item
+        self.bounds = bounds[order]  # minx, miny, maxx, maxy per item
+
+        # Levels of nodes, from the leaves up. Each is a tuple of the node
+        # bounds and the start and end of its children in the level below
+        # (the items, for the leaves).
+        # Every level is sorted with STR again before it is packed into
+        # the next one; nodes keep their ranges of children when reordered.
+        self.levels = [_pack(self.bounds, node_size)]
+        while len(self.levels[-1][0]) > 1:
+            level_bounds, starts, ends = self.levels[-1]
+            order = _str_order(level_bounds, node_size)
+            self.levels[-1] = (level_bounds[order], starts[order], ends[order])
+            self.levels.append(_pack(level_bounds[order], node_size))
+
+    def __len__(self):
+        return len(self.items)
+
+    def bbox(self, minx, miny, maxx, maxy, types=None):
+        """Return the elements whose bounding box intersects this one."""
+        return self._select(self._bbox(minx, miny, maxx, maxy), types)
+
+    def radius(self, x, y, r, types=None):
+        """Return the elements within distance r of point (x, y), nearest
+        first."""
+        candidates = self._bbox(x - r, y - r, x + r, y + r)
+        distances = self._distances(x, y, candidates)
+        within = distances <= r
+        candidates, distances = candidates[within], distances[within]
+        return self._select(candidates[np.argsort(distances, kind='stable')],
+                            types)
+
+    def nearest(self, x, y, k=1, types=None):
+        """Return the k elements nearest to point (x, y), nearest first."""
+        if not len(self.items) or k < 1:
+            return []
+
+        minx, miny, maxx, maxy = self.levels[-1][0][0]  # The root node
+        # Beyond this distance, everything is included.
+        limit = math.hypot(max(abs(x - minx), abs(x - maxx)),
+                           max(abs(y - miny), abs(y - maxy)))
+        # Start with a radius that would hold about k items if they were
+        # spread evenly, and double it until there are enough.
+        area = max((maxx - minx) * (maxy - miny), 1e-12)
+        r = max(math.sqrt(area * k / len(self.items)), 1e-6)
+
+        while True:
+            found = self.radius(x, y, r, types)
+            if len(found) >= k or r >= limit:
+                return found[:k]
+            r *= 2
+
+    def _bbox(self, minx, miny, maxx, maxy):
+        """Return the indexes of the items intersecting the box."""
+        nodes = np.arange(len(self.levels[-1][0]))
+        for level_bounds, starts, ends in reversed(self.levels):
+            b = level_bounds[nodes]
+            nodes = nodes[(b[:, 0] <= maxx) & (b[:, 2] >= minx) &
+                          (b[:, 1] <= maxy) & (b[:, 3] >= miny)]
+            nodes = _ranges(starts[nodes], ends[nodes])
+        b = self.bounds[nodes]
+        return nodes[(b[:, 0] <= maxx) & (b[:, 2] >= minx) &
+                     (b[:, 1] <= maxy) & (b[:, 3] >= miny)]
+
+    def _distances(self, x, y, indexes):
+        """Return the distances of the items to point (x, y)."""
+        x1, y1, x2, y2 = self.coords[indexes].T
+        dx = x2 - x1
+        dy = y2 - y1
+        length2 = dx * dx + dy * dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(length2 > 0,
+                         ((x - x1) * dx + (y - y1) * dy) / length2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        return np.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+    def _select(self, indexes, types):
+        items = [self.items[i] for i in indexes]
+        if types is not None:
+            items = [item for item in items if isinstance(item, types)]
+        return items
+
+
+def _segment(element):
+    """Return (x1, y1, x2, y2) of an element, or None."""
+    try:
+        if isinstance(element, models.Pipe):
+            start = element.manhole1.geom
+            end = element.manhole2.geom
+        else:
+            start = end = element.geom
+        return (start.GetX(), start.GetY(), end.GetX(), end.GetY())
+    except AttributeError:  # No manhole or geometry
+        return None
+
+
+def _str_order(bounds, node_size):
+    """Return the order of boxes according to Sort-Tile-Recursive: sort by
+    x into vertical slices, then by y within each slice."""
+    n = len(bounds)
+    if n == 0:
+        return np.arange(0)
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2
+    nodes = int(math.ceil(n / node_size))
+    slices = int(math.ceil(math.sqrt(nodes)))
+    slice_size = slices * node_size
+
+    by_x = np.argsort(cx, kind='stable')
+    slice_of = np.empty(n, dtype=int)
+    slice_of[by_x] = np.arange(n) // slice_size
+    return np.lexsort((cy, slice_of))
+
+
+def _pack(bounds, node_size):
+    """Return (bounds, starts, ends) of the parent nodes of consecutive
+    groups of node_size boxes."""
+    n = len(bounds)
+    starts = np.arange(0, max(n, 1), node_size)
+    ends = np.minimum(starts + node_size, n)
+    if n == 0:
+        return np.zeros((1, 4)) + [np.inf, np.inf, -np.inf, -np.inf], \
+            starts, ends
+    parent_bounds = np.column_stack([
+        np.minimum.reduceat(bounds[:, 0], starts),
+        np.minimum.reduceat(bounds[:, 1], starts),
+        np.maximum.reduceat(bounds[:, 2], starts),
+        np.maximum.reduceat(bounds[:, 3], starts),
+    ])
+    return parent_bounds, starts, ends
+
+
+def _ranges(starts, ends):
+    """Return the concatenation of the ranges [start, end)."""
+    lengths = ends - starts
+    total = lengths.sum()
+    if not total:
+        return np.arange(0)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
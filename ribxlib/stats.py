@@ -0,0 +1,118 @@
+# (c) Nelen & Schuurmans.  GPL licensed, see LICENSE.rst.
+# -*- coding: utf-8 -*-
+"""Opt-in instrumentation of parsing, to find out where time goes.
+
+Pass a ``ParseStats`` instance to ``parsers.parse`` or ``parsers.iterparse``.
+Without one, nothing is measured and the parser runs at full speed.
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from contextlib import contextmanager
+import functools
+import timeit
+
+timer = timeit.default_timer
+
+
+class Timing(object):
+    """Accumulated wall time and number of calls."""
+    __slots__ = ('seconds', 'calls')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+
+    def add(self, seconds, calls=1):
+        self.seconds += seconds
+        self.calls += calls
+
+    def as_dict(self):
+        return {'seconds': self.seconds, 'calls': self.calls}
+
+
+class ParseStats(object):
+    """Timings and counts collected during parsing.
+
+    Attributes:
+      phases: Phase name ('xml', 'elements') -> Timing. ``iterparse``
+        interleaves the phases, it only reports 'xml'; the time spent on
+        elements is that of 'ElementParser.parse' in methods.
+      methods: 'ElementParser.<method>' -> Timing. Timings are inclusive:
+        the time of methods called by a method is included in its time.
+      elements: ZB_* tag -> number of records.
+      errors: ZB_* tag -> number of records that couldn't be parsed.
+
+    Args:
+      callback: Optional function that is called with the name and the
+        duration in seconds each time a phase ends, e.g. to feed metrics.
+
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.phases = defaultdict(Timing)
+        self.methods = defaultdict(Timing)
+        self.elements = defaultdict(int)
+        self.errors = defaultdict(int)
+        self._instrumented = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of parsing."""
+        start = timer()
+        try:
+            yield
+        finally:
+            self.add_phase(name, timer() - start)
+
+    def add_phase(self, name, seconds, calls=1):
+        self.phases[name].add(seconds, calls)
+        if self.callback is not None:
+            self.callback(name, seconds)
+
+    def count(self, tag, ok=True):
+        """Count a parsed record."""
+        self.elements[tag] += 1
+        if not ok:
+            self.errors[tag] += 1
+
+    def instrument(self, cls, method_names):
+        """Return a subclass of cls whose methods record their timings."""
+        key = (cls, tuple(method_names))
+        if key not in self._instrumented:
+            attributes = dict(
+                (name, self._timed(getattr(cls, name),
+                                   '{}.{}'.format(cls.__name__, name)))
+                for name in method_names)
+            self._instrumented[key] = type(
+                str('Instrumented' + cls.__name__), (cls,), attributes)
+        return self._instrumented[key]
+
+    def _timed(self, method, name):
+        timing = self.methods[name]
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timing.add(timer() - start)
+
+        return timed
+
+    def as_dict(self):
+        return {
+            'phases': dict((name, timing.as_dict())
+                           for name, timing in self.phases.items()),
+            'methods': dict((name, timing.as_dict())
+                            for name, timing in self.methods.items()),
+            'elements': dict(self.elements),
+            'errors': dict(self.errors),
+        }
@@ -0,0 +1,133 @@
+import asyncio
+from io import BytesIO
+import io
+import os
+import sys
+import unittest
+
+from ribxlib import parsers
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX12_DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_12')
+RIBX13_DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13')
+
+RIBX13_FILE = os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx")
+
+
+def key(element):
+    return element.sourceline, element.ref
+
+
+@unittest.skipIf(sys.version_info < (3, 7), "Requires Python 3.7+")
+class TestParseAsync(unittest.TestCase):
+    """parse_async must find the same elements and errors as parse."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_until_complete(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def collect(self, async_iterable):
+        """Return the items of an async iterable, without async syntax."""
+        iterator = async_iterable.__aiter__()
+        items = []
+        while True:
+            try:
+                items.append(self.run_until_complete(iterator.__anext__()))
+            except StopAsyncIteration:
+                return items
+
+    def stream(self, f, chunk_size=100):
+        """Return a StreamReader that has been fed the file in chunks."""
+        reader = asyncio.StreamReader(loop=self.loop)
+        with open(f, 'rb') as fileobj:
+            data = fileobj.read()
+        for i in range(0, len(data), chunk_size):
+            reader.feed_data(data[i:i + chunk_size])
+        reader.feed_eof()
+        return reader
+
+    def assertSameAsParse(self, f, mode):
+        expected, expected_log = parse(f, mode)
+        ribx, log = self.run_until_complete(parsers.parse_async(f, mode))
+        self.assertEqual(sorted(map(key, expected.elements())),
+                         sorted(map(key, ribx.elements())))
+        self.assertEqual(sorted(expected_log, key=lambda e: e['line']), log)
+
+    def test_ribx_13(self):
+        self.assertSameAsParse(RIBX13_FILE, Mode.INSPECTION)
+
+    def test_ribx_12_with_errors(self):
+        self.assertSameAsParse(
+            os.path.join(RIBX12_DATA_DIR, "reiniging_leiding.ribx"),
+            Mode.PREINSPECTION)
+
+    def test_async_iteration(self):
+        expected = list(parsers.iterparse(RIBX13_FILE, Mode.INSPECTION))
+        elements = self.collect(
+            parsers.parse_async(RIBX13_FILE, Mode.INSPECTION))
+        self.assertEqual(list(map(key, expected)), list(map(key, elements)))
+
+    def test_stream_reader(self):
+        ribx, log = self.run_until_complete(parsers.parse_async(
+            self.stream(RIBX13_FILE), Mode.INSPECTION))
+        self.assertEqual(2, len(ribx.inspection_pipes))
+        self.assertEqual(
+            sorted(map(key, parse(RIBX13_FILE, Mode.INSPECTION)[0].elements())),
+            sorted(map(key, ribx.elements())))
+
+    def test_file_object(self):
+        with open(RIBX13_FILE, 'rb') as f:
+            ribx, log = self.run_until_complete(
+                parsers.parse_async(f, Mode.INSPECTION))
+        self.assertEqual(2, len(ribx.inspection_pipes))
+
+    def test_not_well_formed(self):
+        reader = asyncio.StreamReader(loop=self.loop)
+        reader.feed_data(b'<DATA><ZB_A><AAA>pipe</AAA></ZB_A><ZB_A>')
+        reader.feed_eof()
+        error_log = []
+        elements = self.collect(
+            parsers.parse_async(reader, Mode.INSPECTION, error_log))
+        self.assertEqual([], elements)
+        # The first record was parsed (and rejected) before the syntax error.
+        self.assertEqual(2, len(error_log))
+        self.assertTrue('ZB_A' in error_log[0]['message'])
+        self.assertEqual('FATAL', error_log[1]['level'])
+
+    def test_not_well_formed_awaited(self):
+        # Like parse: no elements, and only the syntax error.
+        data = b'<DATA><ZB_E><EAA>a</EAA></ZB_E><ZB_A></ZB_A><ZB_E>'
+        ribx, log = self.run_until_complete(
+            parsers.parse_async(BytesIO(data), Mode.PREINSPECTION))
+        expected_ribx, expected_log = parse(BytesIO(data), Mode.PREINSPECTION)
+        self.assertEqual([], ribx.drains)
+        self.assertEqual(1, len(log))
+        self.assertEqual('FATAL', log[0]['level'])
+        self.assertEqual(len(expected_log), len(log))
+
+        # Iterating gives the elements before the syntax error.
+        error_log = []
+        elements = self.collect(
+            parsers.parse_async(BytesIO(data), Mode.PREINSPECTION, error_log))
+        self.assertEqual(['a'], [element.ref for element in elements])
+        self.assertEqual(2, len(error_log))
+
+    def test_earlier_syntax_errors_are_not_reported(self):
+        for i in range(2):
+            ribx, log = self.run_until_complete(parsers.parse_async(
+                BytesIO(b'<DATA><ZB_E>'), Mode.PREINSPECTION))
+            self.assertEqual(1, len(log))
+
+    def test_text_mode(self):
+        with io.open(RIBX13_FILE, encoding='iso-8859-1') as f:
+            ribx, log = self.run_until_complete(
+                parsers.parse_async(f, Mode.INSPECTION))
+        self.assertEqual(2, len(ribx.inspection_pipes))
@@ -0,0 +1,59 @@
+import os
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX12_DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_12')
+RIBX13_DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13')
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class ToArraysTest(unittest.TestCase):
+
+    def test_inspection_pipes(self):
+        f = os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx")
+        ribx, log = parse(f, Mode.INSPECTION)
+        arrays = ribx.to_arrays()
+
+        pipes = arrays['inspection_pipes']
+        self.assertEqual(2, len(pipes))
+        p0 = ribx.inspection_pipes[0]
+        self.assertEqual(p0.ref, pipes['ref'][0])
+        self.assertEqual(p0.sourceline, pipes['sourceline'][0])
+        self.assertEqual(
+            [p0.manhole1.geom.GetX(), p0.manhole1.geom.GetY()],
+            list(pipes['start'][0]))
+        self.assertEqual(np.datetime64(p0.inspection_date, 's'),
+                         pipes['inspection_date'][0])
+        self.assertEqual(p0.expected_inspection_length,
+                         pipes['expected_inspection_length'][0])
+
+        observations = arrays['observations']
+        self.assertEqual(
+            sum(len(pipe.observations) for pipe in ribx.inspection_pipes),
+            len(observations))
+        self.assertEqual(len(p0.observations),
+                         np.count_nonzero(observations['parent'] == 0))
+        self.assertEqual(p0.observations[0].observation_type,
+                         observations['code'][0])
+
+    def test_manholes(self):
+        f = os.path.join(RIBX12_DATA_DIR, "reiniging_leiding.ribx")
+        ribx, log = parse(f, Mode.INSPECTION)
+        arrays = ribx.to_arrays()
+
+        manholes = arrays['cleaning_manholes']
+        self.assertEqual(len(ribx.cleaning_manholes), len(manholes))
+        self.assertEqual(len(ribx.cleaning_pipes),
+                         len(arrays['cleaning_pipes']))
+        self.assertTrue(np.isnan(
+            arrays['cleaning_pipes']['segment_length']).all())
+        self.assertEqual(0, len(arrays['drains']))
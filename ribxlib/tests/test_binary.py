@@ -0,0 +1,139 @@
+from datetime import datetime
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from ribxlib import binary
+from ribxlib import geometry
+from ribxlib import models
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX12_DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_12')
+RIBX13_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13',
+    '36190148 5300093.ribx')
+
+ATTRIBUTES = ['ref', 'owner', 'sourceline', 'inspection_date',
+              'work_impossible', 'new', 'media']
+PIPE_ATTRIBUTES = ['manhole_start', 'expected_inspection_length',
+                   'segment_length']
+MANHOLE_ATTRIBUTES = ['ref', 'sourceline', 'media', 'geom']
+
+
+def describe(element):
+    """Return the stored attributes of an element, as a dict."""
+    result = dict((name, getattr(element, name)) for name in ATTRIBUTES)
+    if isinstance(element, models.Pipe):
+        for name in ('manhole1', 'manhole2'):
+            manhole = getattr(element, name)
+            result[name] = manhole and dict(
+                (attribute, getattr(manhole, attribute))
+                for attribute in MANHOLE_ATTRIBUTES)
+    else:
+        result['geom'] = element.geom
+    if isinstance(element, models.InspectionPipe):
+        for name in PIPE_ATTRIBUTES:
+            result[name] = getattr(element, name)
+        result['observations'] = [
+            (o.fields, o.videos, o.photos, o.distance, o.observation_type)
+            for o in element.observations]
+    return result
+
+
+class BinaryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ribx.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertRoundTrip(self, ribx):
+        ribx.dump(self.path)
+        loaded = models.Ribx.load(self.path)
+        for name in models.Ribx.ELEMENT_LISTS:
+            self.assertEqual(
+                [describe(element) for element in getattr(ribx, name)],
+                [describe(element) for element in getattr(loaded, name)])
+            for element in getattr(loaded, name):
+                self.assertTrue(type(element) is models.MODELS[element.tag])
+        return loaded
+
+    def test_ribx_13(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        loaded = self.assertRoundTrip(ribx)
+        self.assertEqual(ribx.media, loaded.media)
+
+    def test_ribx_12(self):
+        for filename in os.listdir(RIBX12_DATA_DIR):
+            if filename.endswith('.ribx'):
+                ribx, log = parse(os.path.join(RIBX12_DATA_DIR, filename),
+                                  Mode.PREINSPECTION)
+                self.assertRoundTrip(ribx)
+
+    def test_values(self):
+        ribx = models.Ribx()
+        pipe = models.InspectionPipe(u'pipe \xe9')
+        pipe.inspection_date = datetime(2017, 9, 29, 13, 45, 1)
+        pipe.manhole1 = models.Manhole('m1')
+        pipe.manhole1.geom = geometry.point(1.5, 2.5, 3.5)
+        pipe.manhole1.media.add('m1.jpg')
+        pipe.manhole2 = models.Manhole('m2')
+        pipe.work_impossible = 'Niet aangetroffen'
+        pipe.new = True
+        pipe.expected_inspection_length = 12.5
+        pipe.observations.append(models.Observation.from_fields(
+            {'A': 'BAB', 'I': '1.5', 'B': None}, ['v.mpg'], ['p.jpg']))
+        ribx.inspection_pipes.append(pipe)
+        ribx.cleaning_pipes.append(models.CleaningPipe('cleaning'))
+        drain = models.Drain('drain')
+        drain.owner = 'A'
+        ribx.drains.append(drain)
+        self.assertRoundTrip(ribx)
+
+    def test_empty(self):
+        loaded = self.assertRoundTrip(models.Ribx())
+        self.assertEqual(frozenset(), loaded.media)
+
+    def test_lists_are_loaded_lazily(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        ribx.dump(self.path)
+        loaded = models.Ribx.load(self.path)
+        self.assertIsNone(loaded._inspection_pipes)
+        self.assertEqual(0, len(loaded.drains))
+        self.assertIsNone(loaded._inspection_pipes)
+        self.assertEqual(2, len(loaded.inspection_pipes))
+
+    def test_loaded_lists_invalidate(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        ribx.dump(self.path)
+        loaded = models.Ribx.load(self.path)
+        loaded.drains.append(models.Drain('drain'))
+        self.assertEqual(1, len(loaded.elements_by_ref('drain')))
+
+    def test_pickle(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        ribx.dump(self.path)
+        copy = pickle.loads(pickle.dumps(models.Ribx.load(self.path)))
+        self.assertEqual(2, len(copy.inspection_pipes))
+
+    def test_incomplete(self):
+        ribx = models.Ribx()
+        self.assertTrue(self.assertRoundTrip(ribx).complete)
+        ribx.complete = False
+        self.assertFalse(self.assertRoundTrip(ribx).complete)
+
+    def test_not_a_binary_file(self):
+        self.assertRaises(binary.FormatError, models.Ribx.load, RIBX13_FILE)
+
+    def test_other_version(self):
+        models.Ribx().dump(self.path)
+        with open(self.path, 'r+b') as f:
+            f.seek(len(binary.MAGIC))
+            f.write(b'\xff')
+        self.assertRaises(binary.FormatError, models.Ribx.load, self.path)
@@ -0,0 +1,120 @@
+from io import BytesIO
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from ribxlib import cache as cache_module
+from ribxlib.cache import ParseCache
+from ribxlib.parsers import Mode
+
+RIBX13_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13',
+    '36190148 5300093.ribx')
+
+DRAIN = b"<DATA><ZB_E><EAA>%s</EAA></ZB_E></DATA>"
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_repeated_parse_is_cached(self):
+        cache = ParseCache()
+        ribx, log = cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        self.assertEqual((ribx, log), cache.parse(RIBX13_FILE, Mode.INSPECTION))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_mode_is_part_of_the_key(self):
+        cache = ParseCache()
+        cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        cache.parse(RIBX13_FILE, Mode.PREINSPECTION)
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+
+    def test_file_objects(self):
+        cache = ParseCache()
+        with open(RIBX13_FILE, 'rb') as f:
+            ribx, log = cache.parse(f, Mode.INSPECTION)
+        self.assertEqual(2, len(ribx.inspection_pipes))
+        cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        self.assertEqual(1, cache.hits)
+
+    def test_lru_eviction(self):
+        cache = ParseCache(max_entries=2)
+        for ref in [b'a', b'b', b'a', b'c']:
+            cache.parse(BytesIO(DRAIN % ref), Mode.PREINSPECTION)
+        self.assertEqual(2, len(cache))
+        cache.parse(BytesIO(DRAIN % b'a'), Mode.PREINSPECTION)  # Hit
+        cache.parse(BytesIO(DRAIN % b'b'), Mode.PREINSPECTION)  # Evicted
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+
+    def test_byte_limit(self):
+        cache = ParseCache(max_bytes=len(DRAIN % b'a') + 1)
+        cache.parse(BytesIO(DRAIN % b'a'), Mode.PREINSPECTION)
+        cache.parse(BytesIO(DRAIN % b'b'), Mode.PREINSPECTION)
+        self.assertEqual(1, len(cache))
+
+    def test_disk_tier(self):
+        ribx, log = ParseCache(directory=self.directory).parse(
+            RIBX13_FILE, Mode.INSPECTION)
+
+        cache = ParseCache(directory=self.directory)
+        cached_ribx, cached_log = cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(log, cached_log)
+        self.assertEqual(
+            [(p.ref, p.sourceline, p.manhole_start)
+             for p in ribx.inspection_pipes],
+            [(p.ref, p.sourceline, p.manhole_start)
+             for p in cached_ribx.inspection_pipes])
+        self.assertEqual(ribx.media, cached_ribx.media)
+
+    def test_disk_tier_error_log(self):
+        data = DRAIN.replace(b'</EAA>', b'</EAA><EXD>Q</EXD>')
+        ribx, log = ParseCache(directory=self.directory).parse(
+            BytesIO(data % b'a'), Mode.PREINSPECTION)
+
+        cache = ParseCache(directory=self.directory)
+        cached_ribx, cached_log = cache.parse(
+            BytesIO(data % b'a'), Mode.PREINSPECTION)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(log, cached_log)
+        self.assertEqual(log.summary(), cached_log.summary())
+        self.assertEqual([r.key for r in log.records()],
+                         [r.key for r in cached_log.records()])
+
+    def test_nothing_is_unpickled(self):
+        ParseCache(directory=self.directory).parse(
+            RIBX13_FILE, Mode.INSPECTION)
+        for name in os.listdir(self.directory):
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                pickle.dump(ValueError('Not a cache entry'), f)
+
+        cache = ParseCache(directory=self.directory)
+        ribx, log = cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+        self.assertEqual(2, len(ribx.inspection_pipes))
+
+    def test_version_is_part_of_the_key(self):
+        ParseCache(directory=self.directory).parse(
+            RIBX13_FILE, Mode.INSPECTION)
+        version = cache_module.CACHE_VERSION
+        cache_module.CACHE_VERSION = version + 1
+        try:
+            cache = ParseCache(directory=self.directory)
+            cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        finally:
+            cache_module.CACHE_VERSION = version
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+
+    def test_disk_write_failure_is_ignored(self):
+        cache = ParseCache(
+            directory=os.path.join(self.directory, 'does-not-exist'))
+        ribx, log = cache.parse(RIBX13_FILE, Mode.INSPECTION)
+        self.assertEqual(2, len(ribx.inspection_pipes))
+        self.assertEqual(1, len(cache))
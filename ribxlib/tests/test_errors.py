@@ -0,0 +1,116 @@
+from io import BytesIO
+import json
+import logging
+import os
+import pickle
+import unittest
+
+from ribxlib import errors
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX12_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_12',
+    'reiniging_leiding.ribx')
+
+# Drains with unknown EXD codes on lines 2, 3 and 4, and no EAA on line 5.
+DOCUMENT = b"""<DATA>
+<ZB_E><EAA>a</EAA><EXD>Q</EXD></ZB_E>
+<ZB_E><EAA>b</EAA><EXD>Q</EXD></ZB_E>
+<ZB_E><EAA>c</EAA><EXD>R</EXD></ZB_E>
+<ZB_E></ZB_E>
+</DATA>"""
+
+
+class Handler(logging.Handler):
+    """Collects the messages logged by ribxlib.errors."""
+
+    def __enter__(self):
+        self.messages = []
+        logging.getLogger('ribxlib.errors').addHandler(self)
+        return self.messages
+
+    def __exit__(self, *exc_info):
+        logging.getLogger('ribxlib.errors').removeHandler(self)
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class ErrorLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ribx, self.log = parse(BytesIO(DOCUMENT), Mode.PREINSPECTION)
+
+    def test_records(self):
+        record = self.log.records()[0]
+        self.assertEqual('unknown_xd', record.code)
+        self.assertEqual('ZB_E', record.tag)
+        self.assertEqual('EXD', record.expr)
+        self.assertEqual(2, record.line)
+        self.assertEqual(('EXD', 'Q'), record.params)
+
+    def test_dicts(self):
+        self.assertEqual(4, len(self.log))
+        self.assertEqual({
+            'line': 2,
+            'message': 'Element ZB_E has problems with EXD: '
+                       'Onbekende EXDXD code "Q"',
+        }, self.log[0])
+        self.assertEqual([2, 3, 4, 5], [entry['line'] for entry in self.log])
+        self.assertEqual(list(self.log), self.log[:])
+        self.assertEqual(list(self.log), self.log)
+
+    def test_groups(self):
+        groups = self.log.groups()
+        self.assertEqual([[2, 3], [4], [5]], [g.lines for g in groups])
+        self.assertEqual(self.log[0]['message'], groups[0].message)
+
+    def test_summary(self):
+        summary = self.log.summary()
+        self.assertEqual(
+            u'Element ZB_E has problems with EXD: Onbekende EXDXD code "Q" '
+            u'\xd72', summary[0])
+        self.assertEqual(self.log[2]['message'], summary[1])
+
+    def test_many_identical_errors(self):
+        ribx, log = parse(RIBX12_FILE, Mode.PREINSPECTION)
+        self.assertEqual(798, len(log))
+        self.assertEqual([u'\xd7424', u'\xd7374'],
+                         [line[-4:] for line in log.summary()])
+
+    def test_logged_once(self):
+        log = errors.ErrorLog()
+        record = errors.ErrorRecord('missing', 'ZB_E', 'EAA', 1, ('EAA',))
+        with Handler() as logged:
+            log.report(record)
+            log.report(record)
+        self.assertEqual(2, len(log))
+        self.assertEqual(1, len(logged))
+
+    def test_logging_is_limited(self):
+        log = errors.ErrorLog()
+        with Handler() as logged:
+            for line in range(errors.MAX_LOGGED + 5):
+                log.report(errors.ErrorRecord(
+                    'exception', 'ZB_E', 'EAA', line, (str(line),)))
+        self.assertEqual(errors.MAX_LOGGED + 1, len(logged))
+
+    def test_syntax_errors_are_dicts(self):
+        ribx, log = parse(BytesIO(b'<DATA>'), Mode.PREINSPECTION)
+        self.assertEqual('FATAL', log[0]['level'])
+        self.assertEqual(1, len(log.groups()))
+
+    def test_list(self):
+        self.assertTrue(isinstance(self.log, list))
+        self.assertEqual(list(self.log), json.loads(json.dumps(self.log)))
+        self.assertEqual(5, len(self.log + [{'line': 6, 'message': 'More'}]))
+
+    def test_json_of_parse_result(self):
+        ribx, log = parse(RIBX12_FILE, Mode.PREINSPECTION)
+        self.assertEqual(798, len(json.loads(json.dumps(log))))
+
+    def test_pickle(self):
+        log = pickle.loads(pickle.dumps(self.log, 2))
+        self.assertEqual(self.log, log)
+        self.assertEqual(4, len(log.records()))
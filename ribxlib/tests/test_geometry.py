@@ -0,0 +1,71 @@
+import struct
+import unittest
+
+from ribxlib import geometry
+from ribxlib import models
+
+
+class PointTest(unittest.TestCase):
+
+    def test_ogr_like_api(self):
+        point = geometry.point(144054.76, 488764.43)
+        self.assertEqual(144054.76, point.GetX())
+        self.assertEqual(488764.43, point.GetY())
+        self.assertEqual((144054.76, 488764.43, 0.0), point.GetPoint())
+
+    def test_wkt(self):
+        self.assertEqual('POINT (1.5 2.0)',
+                         geometry.point(1.5, 2).ExportToWkt())
+
+    def test_wkb(self):
+        wkb = geometry.point(1.5, 2.0).ExportToWkb()
+        self.assertEqual((1, 1, 1.5, 2.0), struct.unpack('<BIdd', wkb))
+
+    def test_wrong_number_of_coordinates(self):
+        self.assertRaises(ValueError, geometry.point, 1.5)
+
+
+class LineStringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.line = geometry.line_string(
+            geometry.point(0.0, 0.0), geometry.point(3.0, 4.0))
+
+    def test_length(self):
+        self.assertEqual(5.0, self.line.Length())
+
+    def test_wkt(self):
+        self.assertEqual('LINESTRING (0.0 0.0,3.0 4.0)',
+                         self.line.ExportToWkt())
+
+    def test_wkb(self):
+        wkb = self.line.ExportToWkb()
+        self.assertEqual((1, 2, 2), struct.unpack('<BII', wkb[:9]))
+        self.assertEqual((3.0, 4.0), struct.unpack('<dd', wkb[-16:]))
+
+    def test_pipe_geom(self):
+        pipe = models.InspectionPipe('pipe')
+        pipe.manhole1 = models.Manhole('manhole1')
+        pipe.manhole1.geom = geometry.point(0.0, 0.0)
+        pipe.manhole2 = models.Manhole('manhole2')
+        pipe.manhole2.geom = geometry.point(3.0, 4.0)
+        self.assertEqual(self.line, pipe.geom)
+
+
+@unittest.skipIf(geometry.ogr is None, "GDAL/OGR is not installed")
+class OgrBackendTest(unittest.TestCase):
+
+    def tearDown(self):
+        geometry.set_backend('simple')
+
+    def test_ogr_point(self):
+        geometry.set_backend('ogr')
+        point = geometry.make_point(1.5, 2.0)
+        self.assertEqual(
+            point.ExportToWkt(), geometry.point(1.5, 2.0).to_ogr().ExportToWkt())
+
+
+class BackendTest(unittest.TestCase):
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, geometry.set_backend, 'shapely')
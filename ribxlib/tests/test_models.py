@@ -1,6 +1,16 @@
+import os
+import pickle
 import unittest
 
+from lxml.etree import XML
+
 from ribxlib import models
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX13_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13',
+    '36190148 5300093.ribx')
 
 
 class ModelTest(unittest.TestCase):
@@ -43,3 +53,175 @@ class ModelTest(unittest.TestCase):
         ])
 
         self.assertEqual(expected, ribx.media)
+
+
+class SlotsTest(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        for model in list(models.MODELS.values()) + [models.Manhole]:
+            self.assertFalse(hasattr(model('ref'), '__dict__'), model)
+
+    def test_media_created_lazily(self):
+        manhole = models.Manhole('ref')
+        manhole.add_media([])
+        self.assertIsNone(manhole._media)
+        manhole.add_media(['a.mpg'])
+        self.assertEqual(set(['a.mpg']), manhole.media)
+
+    def test_parsed_manholes_without_media(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        for pipe in ribx.inspection_pipes:
+            self.assertIsNone(pipe.manhole1._media)
+
+    def test_manhole_refs_are_shared(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        p0, p1 = ribx.inspection_pipes
+        self.assertIs(p0.manhole1.ref, p1.manhole1.ref)
+
+    def test_pickle(self):
+        pipe = models.InspectionPipe('pipe')
+        pipe.manhole1 = models.Manhole('manhole')
+        pipe.media.add('pipe.mpg')
+        copy = pickle.loads(pickle.dumps(pipe, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual('pipe', copy.ref)
+        self.assertEqual('manhole', copy.manhole1.ref)
+        self.assertEqual(set(['pipe.mpg']), copy.media)
+        self.assertEqual([], copy.observations)
+
+
+class ObservationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.observation = models.Observation(XML("""
+        <ZC>
+          <A>BAB</A>
+          <B>B</B>
+          <!-- a comment -->
+          <I> 2.50 </I>
+          <N>video.mpg|00:01:02</N>
+          <M>photo.jpg</M>
+        </ZC>
+        """))
+
+    def test_fields(self):
+        self.assertEqual('BAB', self.observation.observation_type)
+        self.assertEqual(2.5, self.observation.distance)
+        self.assertEqual('B', self.observation.fields['B'])
+
+    def test_media(self):
+        self.assertEqual(['video.mpg', 'photo.jpg'],
+                         list(self.observation.media()))
+
+    def test_detached_from_tree(self):
+        self.assertFalse(hasattr(self.observation, 'zc_node'))
+        self.assertFalse(hasattr(self.observation, '__dict__'))
+        copy = pickle.loads(pickle.dumps(self.observation))
+        self.assertEqual(self.observation.fields, copy.fields)
+        self.assertEqual(self.observation.videos, copy.videos)
+
+
+class RibxIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+
+    def test_duplicate_refs(self):
+        p0, p1 = self.ribx.inspection_pipes
+        self.assertEqual([p0, p1], self.ribx.elements_by_ref(p0.ref))
+        self.assertEqual([], self.ribx.elements_by_ref('unknown'))
+
+    def test_pipes_by_manhole(self):
+        p0, p1 = self.ribx.inspection_pipes
+        self.assertEqual([p0, p1],
+                         self.ribx.pipes_by_manhole(p0.manhole1.ref))
+        self.assertEqual([], self.ribx.pipes_by_manhole('unknown'))
+
+    def test_elements_by_media(self):
+        p0, p1 = self.ribx.inspection_pipes
+        for filename in p0.media:
+            self.assertTrue(p0 in self.ribx.elements_by_media(filename))
+        self.assertEqual([], self.ribx.elements_by_media('unknown.jpg'))
+
+    def test_manhole_media_are_attributed_to_the_pipe(self):
+        ribx = models.Ribx()
+        pipe = models.CleaningPipe("Pipe")
+        pipe.manhole1 = models.Manhole("Manhole1")
+        pipe.manhole2 = models.Manhole("Manhole2")
+        pipe.manhole1.media.add("manhole1.png")
+        ribx.cleaning_pipes.append(pipe)
+        self.assertEqual([pipe], ribx.elements_by_media("manhole1.png"))
+
+    def test_append_invalidates(self):
+        self.assertEqual([], self.ribx.elements_by_ref('drain'))
+        drain = models.Drain('drain')
+        self.ribx.drains.append(drain)
+        self.assertEqual([drain], self.ribx.elements_by_ref('drain'))
+
+    def test_extend_invalidates(self):
+        self.assertEqual([], self.ribx.elements_by_ref('drain'))
+        drain = models.Drain('drain')
+        self.ribx.drains.extend([drain])
+        self.assertEqual([drain], self.ribx.elements_by_ref('drain'))
+
+    def test_setitem_invalidates(self):
+        p0, p1 = self.ribx.inspection_pipes
+        self.assertEqual([p0, p1], self.ribx.elements_by_ref(p0.ref))
+        pipe = models.InspectionPipe('other')
+        self.ribx.inspection_pipes[1] = pipe
+        self.assertEqual([p0], self.ribx.elements_by_ref(p0.ref))
+        self.assertEqual([pipe], self.ribx.elements_by_ref('other'))
+
+    def test_reassignment_invalidates(self):
+        p0, p1 = self.ribx.inspection_pipes
+        self.assertEqual([p0, p1], self.ribx.elements_by_ref(p0.ref))
+        self.ribx.inspection_pipes = [p1]
+        self.assertEqual([p1], self.ribx.elements_by_ref(p0.ref))
+        self.ribx.inspection_pipes.append(p0)  # Still an ElementList
+        self.assertEqual([p1, p0], self.ribx.elements_by_ref(p0.ref))
+
+    def test_pickle(self):
+        self.ribx.elements_by_ref('x')
+        copy = pickle.loads(pickle.dumps(self.ribx))
+        self.assertEqual(2, len(copy.elements_by_ref(
+            self.ribx.inspection_pipes[0].ref)))
+        copy.drains.append(models.Drain('drain'))
+        self.assertEqual(1, len(copy.elements_by_ref('drain')))
+
+    def test_media_is_cached(self):
+        self.assertIs(self.ribx._index('media_set'),
+                      self.ribx._index('media_set'))
+        self.assertEqual(set(self.ribx._index('media')), self.ribx.media)
+
+    def test_media_is_a_copy(self):
+        media = self.ribx.media
+        media.add('other.mpg')
+        self.assertTrue(isinstance(media, set))
+        self.assertFalse('other.mpg' in self.ribx.media)
+
+    def test_media_follows_add_media(self):
+        drain = models.Drain('drain')
+        self.ribx.drains.append(drain)
+        self.assertFalse('drain.mpg' in self.ribx.media)
+        self.assertEqual([], self.ribx.elements_by_media('drain.mpg'))
+        drain.add_media(['drain.mpg'])
+        self.assertTrue('drain.mpg' in self.ribx.media)
+        self.assertEqual([drain], self.ribx.elements_by_media('drain.mpg'))
+        drain.media = []
+        self.assertFalse('drain.mpg' in self.ribx.media)
+        drain.media.add('other.mpg')
+        self.assertEqual([drain], self.ribx.elements_by_media('other.mpg'))
+
+    def test_other_indexes_are_kept_after_add_media(self):
+        index = self.ribx._index('refs')
+        self.ribx.inspection_pipes[0].add_media(['pipe.mpg'])
+        self.assertIs(index, self.ribx._index('refs'))
+
+    def test_media_follows_the_lists(self):
+        drain = models.Drain('drain')
+        drain.media.add('drain.mpg')
+        self.assertFalse('drain.mpg' in self.ribx.media)
+        self.ribx.drains.append(drain)
+        self.assertTrue('drain.mpg' in self.ribx.media)
+        self.assertEqual([drain], self.ribx.elements_by_media('drain.mpg'))
+        del self.ribx.drains[0]
+        self.assertFalse('drain.mpg' in self.ribx.media)
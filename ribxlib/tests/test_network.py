@@ -0,0 +1,108 @@
+import os
+import unittest
+
+from ribxlib import geometry
+from ribxlib import models
+from ribxlib import network
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX13_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13',
+    '36190148 5300093.ribx')
+
+
+def pipe(ref, start, end, model=models.InspectionPipe):
+    """Return a pipe between two (ref, x, y) manholes."""
+    instance = model(ref)
+    instance.manhole1 = models.Manhole(start[0])
+    instance.manhole1.geom = geometry.point(*start[1:])
+    instance.manhole2 = models.Manhole(end[0])
+    instance.manhole2.geom = geometry.point(*end[1:])
+    return instance
+
+
+class NetworkTest(unittest.TestCase):
+
+    def setUp(self):
+        # a - b - c, b - d, and a separate e - f
+        self.ribx = models.Ribx()
+        a, b, c, d = ('a', 0, 0), ('b', 10, 0), ('c', 20, 0), ('d', 10, 10)
+        self.ribx.inspection_pipes.extend([
+            pipe('ab', a, b), pipe('bc', b, c), pipe('bd', b, d)])
+        self.ribx.cleaning_pipes.append(
+            pipe('ef', ('e', 50, 0), ('f', 60, 0), models.CleaningPipe))
+        self.record = models.InspectionManhole('b')
+        self.record.geom = geometry.point(10, 0.005)
+        self.ribx.inspection_manholes.append(self.record)
+        self.network = network.build(self.ribx, share=True)
+
+    def test_nodes(self):
+        self.assertEqual(['a', 'b', 'c', 'd', 'e', 'f'], self.network.refs)
+        self.assertEqual(4, len(self.network.pipes))
+
+    def test_neighbours(self):
+        b = self.network.node('b')
+        self.assertEqual(3, self.network.degree(b))
+        self.assertEqual(
+            ['a', 'c', 'd'],
+            sorted(self.network.refs[node]
+                   for node, pipe in self.network.neighbours(b)))
+        for node, pipe in self.network.neighbours(b):
+            self.assertTrue(pipe.ref in ('ab', 'bc', 'bd'))
+
+    def test_records(self):
+        self.assertEqual([self.record],
+                         self.network.records[self.network.node('b')])
+        self.assertEqual([], self.network.records[self.network.node('a')])
+
+    def test_shared_manholes(self):
+        ab, bc, bd = self.ribx.inspection_pipes
+        self.assertIs(ab.manhole2, bc.manhole1)
+        self.assertIs(ab.manhole2, bd.manhole1)
+        self.assertIsNot(ab.manhole2, self.record)
+
+    def test_not_shared_by_default(self):
+        ab, bc, bd = self.ribx.inspection_pipes
+        bc.manhole1 = manhole1 = models.Manhole('b')
+        manhole1.geom = geometry.point(10, 0)
+        network.build(self.ribx)
+        self.assertIs(manhole1, bc.manhole1)
+
+    def test_components(self):
+        self.assertEqual([0, 0, 0, 0, 1, 1],
+                         list(self.network.components()))
+
+    def test_no_conflicts(self):
+        self.assertEqual([], self.network.conflicts)
+
+    def test_conflict(self):
+        self.record.geom = geometry.point(10, 1)
+        ab, bc, bd = self.ribx.inspection_pipes
+        bc.manhole1 = models.Manhole('b')
+        bc.manhole1.geom = geometry.point(10, 0)
+        result = network.build(self.ribx, share=True)
+        [conflict] = result.conflicts
+        self.assertEqual('b', conflict.ref)
+        self.assertEqual(
+            [ab, bc, bd, self.record],
+            [element for element, sourceline, point in conflict.locations])
+        # The pipes keep their own manhole.
+        self.assertIsNot(ab.manhole2, bc.manhole1)
+
+    def test_manholes_with_media_are_not_shared(self):
+        ab, bc, bd = self.ribx.inspection_pipes
+        bc.manhole1 = models.Manhole('b')
+        bc.manhole1.geom = geometry.point(10, 0)
+        bc.manhole1.media.add('b.mpg')
+        network.build(self.ribx, share=True)
+        self.assertEqual([bc], self.ribx.elements_by_media('b.mpg'))
+        self.assertIsNot(ab.manhole2, bc.manhole1)
+
+    def test_parsed(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        result = network.build(ribx)
+        p0, p1 = ribx.inspection_pipes
+        self.assertEqual(result.node(p0.manhole1.ref),
+                         result.node(p1.manhole1.ref))
+        self.assertIsNot(p0.manhole1, p1.manhole1)
@@ -1,3 +1,5 @@
+from datetime import datetime
+from io import BytesIO
 import os
 import unittest
 
@@ -9,6 +11,8 @@ from ribxlib import parsers
 from ribxlib.parsers import Mode
 from ribxlib.parsers import parse
 
+RIBX12_DATA_DIR = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_12')
 RIBX13_DATA_DIR = os.path.join(
     os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13')
 
@@ -51,6 +55,65 @@ class TestInspectionPipeParser(unittest.TestCase):
         self.assertTrue(
             'Explanation in attribute' in instance.work_impossible)
 
+    def test_error_mentions_expression(self):
+        node = fromstring("""
+        <ZB_A xmlns:gml="http://www.opengis.net/gml">
+          <AAA>whee</AAA>
+          <AAD>16D0019</AAD>
+          <AAE>
+            <gml:Point srsDimension="2" srsName="Netherlands-RD">
+              <gml:pos>144054.76 north</gml:pos>
+            </gml:Point>
+          </AAE>
+        </ZB_A>
+        """)
+        log = []
+        parsers._parse_node(
+            node, models.InspectionPipe, parsers.Mode.PREINSPECTION, log)
+        self.assertEqual(1, len(log))
+        self.assertTrue(log[0]['message'].startswith(
+            "Element ZB_A has problems with AAE/gml:Point/gml:pos: "))
+
+    def test_observations_parsed_once(self):
+        self.parser.node = fromstring("""
+        <ZB_A>
+          <AAA>whee</AAA>
+          <AAB>16D0019</AAB>
+          <AAD>16D0019</AAD>
+          <AAF>16D0021</AAF>
+          <ABF>2015-7-3</ABF>
+          <ZC><A>BAB</A><I>1.5</I><M>photo1.jpg</M></ZC>
+          <ZC><A>BXA</A><I>2.5</I><M>photo2.jpg</M></ZC>
+        </ZB_A>
+        """)
+        built = []
+        original = models.Observation
+
+        class Observation(original):
+            def __init__(self, zc_node):
+                built.append(self)
+                super(Observation, self).__init__(zc_node)
+
+        models.Observation = Observation
+        try:
+            instance = self.parser.parse()
+        finally:
+            models.Observation = original
+
+        self.assertEqual(built, instance.observations)
+        self.assertEqual(set(['photo1.jpg', 'photo2.jpg']), instance.media)
+
+    def test_xpath(self):
+        self.parser.node = fromstring("<ZB_A><AAA>one</AAA></ZB_A>")
+        self.assertEqual('one', self.parser.xpath('AAA')[0].text)
+        self.assertEqual('AAA', self.parser.expr)
+
+    def test_node_can_be_replaced(self):
+        self.parser.node = fromstring("<ZB_A><AAA>one</AAA></ZB_A>")
+        self.assertEqual('one', self.parser.tag_value('AA')[0])
+        self.parser.node = fromstring("<ZB_A><AAA>two</AAA></ZB_A>")
+        self.assertEqual('two', self.parser.tag_value('AA')[0])
+
 
 class TestInspectionPipeParserRibx_13(unittest.TestCase):
     """Test regarding version 1.3 of Ribx."""
@@ -187,3 +250,497 @@ class TestThingParser(unittest.TestCase):
         self.parser.parse()
         observations = list(self.parser.get_observations())
         self.assertEqual(observations[0].observation_type, 'BXA')
+
+
+class TestParseDatetime(unittest.TestCase):
+
+    def assertSameAsStrptime(self, datestr, timestr=None):
+        if timestr:
+            args = ('{} {}'.format(datestr, timestr), "%Y-%m-%d %H:%M:%S")
+        else:
+            args = (datestr, "%Y-%m-%d")
+        try:
+            expected = datetime.strptime(*args)
+        except ValueError as e:
+            with self.assertRaises(ValueError) as cm:
+                parsers._parse_datetime(datestr, timestr)
+            self.assertEqual(str(e), str(cm.exception))
+        else:
+            self.assertEqual(expected,
+                             parsers._parse_datetime(datestr, timestr))
+
+    def test_valid(self):
+        self.assertSameAsStrptime('2015-07-03')
+        self.assertSameAsStrptime('2015-07-03', '13:45:01')
+        self.assertSameAsStrptime('2016-02-29', '00:00:00')
+        self.assertSameAsStrptime('2015-7-3')  # Accepted by strptime
+
+    def test_invalid(self):
+        self.assertSameAsStrptime('2015-13-03')
+        self.assertSameAsStrptime('2015-02-29')
+        self.assertSameAsStrptime('03-07-2015')
+        self.assertSameAsStrptime('2015-07-03\n')
+        self.assertSameAsStrptime('2015-07-03', '25:00:00')
+        self.assertSameAsStrptime('2015-07-03', '13:45')
+        self.assertSameAsStrptime('2015-07-03 extra')
+
+    def test_memoized(self):
+        first = parsers._parse_datetime('2015-07-04', '10:00:00')
+        self.assertIs(first, parsers._parse_datetime('2015-07-04', '10:00:00'))
+
+
+class TestIterparse(unittest.TestCase):
+    """iterparse must find the same elements and errors as parse."""
+
+    def assertSameAsParse(self, f, mode):
+        ribx, log = parse(f, mode)
+        expected = (ribx.inspection_pipes + ribx.cleaning_pipes +
+                    ribx.inspection_manholes + ribx.cleaning_manholes +
+                    ribx.drains)
+        iter_log = []
+        elements = list(parsers.iterparse(f, mode, iter_log))
+
+        self.assertEqual(
+            sorted((e.sourceline, e.ref) for e in expected),
+            [(e.sourceline, e.ref) for e in elements])
+        self.assertEqual(
+            sorted(log, key=lambda entry: entry['line']), iter_log)
+
+    def test_ribx_13(self):
+        self.assertSameAsParse(
+            os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx"),
+            Mode.INSPECTION)
+
+    def test_ribx_12_with_errors(self):
+        self.assertSameAsParse(
+            os.path.join(RIBX12_DATA_DIR, "reiniging_leiding.ribx"),
+            Mode.PREINSPECTION)
+
+    def test_observations_survive_clearing(self):
+        f = os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx")
+        p0, p1 = parsers.iterparse(f, Mode.INSPECTION)
+        self.assertTrue(p0.observations)
+        self.assertTrue(p0.observations[0].observation_type)
+
+    def test_syntax_error(self):
+        log = []
+        elements = list(parsers.iterparse(
+            BytesIO(b"<DATA><ZB_E><EAA>whee</EAA></ZB_E><ZB_E>"),
+            Mode.PREINSPECTION, log))
+        self.assertEqual(['whee'], [e.ref for e in elements])
+        self.assertEqual(1, len(log))
+
+    def test_strings_are_shared_per_parse(self):
+        data = (b"<DATA><ZB_E><EAA>a</EAA><EAQ>owner</EAQ></ZB_E>"
+                b"<ZB_E><EAA>b</EAA><EAQ>owner</EAQ></ZB_E></DATA>")
+        first = parsers.iterparse(BytesIO(data), Mode.PREINSPECTION)
+        second = parsers.iterparse(BytesIO(data), Mode.PREINSPECTION)
+        a1 = next(first)
+        a2 = next(second)
+        b1 = next(first)
+        self.assertEqual('owner', a2.owner)
+        self.assertIs(a1.owner, b1.owner)
+        self.assertIsNot(a1.owner, a2.owner)
+
+
+class TestErrorBudget(unittest.TestCase):
+    """parse and iterparse with max_errors / fail_fast."""
+
+    # Drains a to c, with an error (no EAA) on lines 3 and 5.
+    DOCUMENT = b"""<DATA>
+<ZB_E><EAA>a</EAA></ZB_E>
+<ZB_E></ZB_E>
+<ZB_E><EAA>b</EAA></ZB_E>
+<ZB_E></ZB_E>
+<ZB_E><EAA>c</EAA></ZB_E>
+</DATA>"""
+
+    def parse(self, **kwargs):
+        return parse(BytesIO(self.DOCUMENT), Mode.PREINSPECTION, **kwargs)
+
+    def test_no_budget(self):
+        ribx, log = self.parse()
+        self.assertEqual(['a', 'b', 'c'], [d.ref for d in ribx.drains])
+        self.assertEqual([3, 5], [entry['line'] for entry in log])
+        self.assertTrue(ribx.complete)
+
+    def test_fail_fast(self):
+        ribx, log = self.parse(fail_fast=True)
+        self.assertEqual(['a'], [d.ref for d in ribx.drains])
+        self.assertEqual([3], [entry['line'] for entry in log])
+        self.assertFalse(ribx.complete)
+
+    def test_budget_runs_out(self):
+        ribx, log = self.parse(max_errors=2)
+        self.assertEqual(['a', 'b'], [d.ref for d in ribx.drains])
+        self.assertEqual(2, len(log))
+        self.assertFalse(ribx.complete)
+
+    def test_budget_suffices(self):
+        ribx, log = self.parse(max_errors=3)
+        self.assertEqual(['a', 'b', 'c'], [d.ref for d in ribx.drains])
+        self.assertEqual(self.parse()[1], log)
+        self.assertTrue(ribx.complete)
+
+    def test_rest_is_not_read(self):
+        broken = self.DOCUMENT.replace(b'</DATA>', b'<ZB_E>')
+        ribx, log = parse(BytesIO(broken), Mode.PREINSPECTION, fail_fast=True)
+        self.assertEqual(['a'], [d.ref for d in ribx.drains])
+        self.assertFalse(ribx.complete)
+
+    def test_syntax_error(self):
+        broken = self.DOCUMENT.replace(b'</DATA>', b'<ZB_E>')
+        ribx, log = parse(BytesIO(broken), Mode.PREINSPECTION, max_errors=3)
+        self.assertEqual([], ribx.drains)
+        self.assertEqual(parse(BytesIO(broken), Mode.PREINSPECTION)[1], log)
+
+    def test_last_record_fails(self):
+        document = self.DOCUMENT.replace(b'<EAA>c</EAA>', b'')
+        ribx, log = parse(BytesIO(document), Mode.PREINSPECTION, max_errors=3)
+        self.assertEqual(3, len(log))
+        self.assertTrue(ribx.complete)
+        ribx, log = parse(BytesIO(document), Mode.PREINSPECTION, max_errors=2)
+        self.assertFalse(ribx.complete)
+
+    def test_nested_records(self):
+        # Only the children of the root are records, as in parse.
+        document = self.DOCUMENT.replace(
+            b'<ZB_E><EAA>b</EAA></ZB_E>',
+            b'<X><ZB_E></ZB_E></X><ZB_E><EAA>b</EAA><ZB_E></ZB_E></ZB_E>')
+        expected_ribx, expected_log = parse(
+            BytesIO(document), Mode.PREINSPECTION)
+        ribx, log = parse(BytesIO(document), Mode.PREINSPECTION, max_errors=3)
+        self.assertEqual(['a', 'b', 'c'], [d.ref for d in ribx.drains])
+        self.assertEqual([d.ref for d in expected_ribx.drains],
+                         [d.ref for d in ribx.drains])
+        self.assertEqual(expected_log, log)
+        self.assertTrue(ribx.complete)
+        self.assertEqual(['a', 'b', 'c'], [e.ref for e in parsers.iterparse(
+            BytesIO(document), Mode.PREINSPECTION)])
+
+    def test_invalid_budget(self):
+        self.assertRaises(ValueError, self.parse, max_errors=0)
+
+    def test_iterparse(self):
+        log = [{'line': 0, 'message': 'Earlier error'}]
+        elements = list(parsers.iterparse(
+            BytesIO(self.DOCUMENT), Mode.PREINSPECTION, log, max_errors=1))
+        self.assertEqual(['a'], [e.ref for e in elements])
+        self.assertEqual([0, 3], [entry['line'] for entry in log])
+
+
+class TestParseMany(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = [
+            os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx"),
+            os.path.join(RIBX13_DATA_DIR, "does not exist.ribx"),
+            os.path.join(RIBX12_DATA_DIR, "reiniging_leiding_planning.ribx"),
+        ]
+
+    def assertSameAsParse(self, results):
+        self.assertEqual(len(self.paths), len(results))
+        for path, ribx, log in results:
+            if 'does not exist' in path:
+                self.assertEqual(1, len(log))
+                continue
+            expected, expected_log = parse(path, Mode.INSPECTION)
+            self.assertEqual(expected_log, log)
+            self.assertEqual(expected.media, ribx.media)
+            self.assertEqual(
+                [pipe.ref for pipe in expected.cleaning_pipes],
+                [pipe.ref for pipe in ribx.cleaning_pipes])
+
+    def test_in_process(self):
+        results = list(parsers.parse_many(
+            self.paths, Mode.INSPECTION, workers=1))
+        self.assertEqual(self.paths, [result[0] for result in results])
+        self.assertSameAsParse(results)
+
+    def test_process_pool(self):
+        results = list(parsers.parse_many(
+            self.paths, Mode.INSPECTION, workers=2))
+        self.assertEqual(self.paths, [result[0] for result in results])
+        self.assertSameAsParse(results)
+
+    def test_unordered(self):
+        results = list(parsers.parse_many(
+            self.paths, Mode.INSPECTION, workers=2, ordered=False))
+        self.assertEqual(sorted(self.paths),
+                         sorted(result[0] for result in results))
+        self.assertSameAsParse(results)
+
+
+class TestParseParallel(unittest.TestCase):
+    """parse_parallel must give the same result as parse."""
+
+    def setUp(self):
+        self.chunk_size = parsers.CHUNK_SIZE
+        parsers.CHUNK_SIZE = 50000  # Make sure there are several chunks
+
+    def tearDown(self):
+        parsers.CHUNK_SIZE = self.chunk_size
+
+    def summary(self, ribx):
+        return [
+            (element.ref, element.sourceline, element.inspection_date,
+             sorted(element.media))
+            for elements in (ribx.inspection_pipes, ribx.cleaning_pipes,
+                             ribx.inspection_manholes,
+                             ribx.cleaning_manholes, ribx.drains)
+            for element in elements
+        ] + [
+            (pipe.manhole1.sourceline, pipe.manhole2.sourceline)
+            for pipe in ribx.inspection_pipes + ribx.cleaning_pipes
+        ]
+
+    def assertSameAsParse(self, f, mode):
+        ribx, log = parse(f, mode)
+        for workers in (1, 2):
+            parallel_ribx, parallel_log = parsers.parse_parallel(
+                f, mode, workers=workers)
+            self.assertEqual(log, parallel_log)
+            self.assertEqual(self.summary(ribx), self.summary(parallel_ribx))
+
+    def test_ribx_12(self):
+        self.assertSameAsParse(
+            os.path.join(RIBX12_DATA_DIR, "reiniging_leiding.ribx"),
+            Mode.INSPECTION)
+
+    def test_ribx_12_with_errors(self):
+        self.assertSameAsParse(
+            os.path.join(RIBX12_DATA_DIR, "reiniging_leiding.ribx"),
+            Mode.PREINSPECTION)
+
+    def test_ribx_13(self):
+        self.assertSameAsParse(
+            os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx"),
+            Mode.INSPECTION)
+
+    def test_syntax_error(self):
+        data = b"<DATA>\n<ZB_E><EAA>whee</EAA></ZB_E>\n<ZB_E></DATA>"
+        ribx, log = parse(BytesIO(data), Mode.PREINSPECTION)
+        parallel_ribx, parallel_log = parsers.parse_parallel(
+            BytesIO(data), Mode.PREINSPECTION, workers=1)
+        self.assertTrue(log)
+        self.assertEqual(log, parallel_log)
+        self.assertFalse(parallel_ribx.drains)
+
+    def assertSameAsParseData(self, data):
+        ribx, log = parse(BytesIO(data), Mode.PREINSPECTION)
+        for workers in (1, 2):
+            parallel_ribx, parallel_log = parsers.parse_parallel(
+                BytesIO(data), Mode.PREINSPECTION, workers=workers)
+            self.assertEqual(log, parallel_log)
+            self.assertEqual(self.summary(ribx),
+                             self.summary(parallel_ribx))
+        return ribx, log
+
+    def test_malformed_record(self):
+        data = (b"<DATA>\n<ZB_E><EAA>whee</EAA></ZB_E>\n" +
+                b"<ZB_C><CAA>x</CAB></ZB_C>\n</DATA>")
+        parsers.CHUNK_SIZE = 10  # So the pool is used with 2 workers
+        ribx, log = self.assertSameAsParseData(data)
+        self.assertTrue(log)
+
+    def test_no_document(self):
+        for data in (b"", b"garbage", b'<?xml version="1.0"?>'):
+            ribx, log = self.assertSameAsParseData(data)
+            self.assertTrue(log)
+
+    def test_doctype_with_entities(self):
+        data = (b'<?xml version="1.0"?>\n'
+                b'<!DOCTYPE DATA [\n<!ENTITY foo "bar">\n]>\n'
+                b'<DATA>\n<ZB_E>\n<EAA>&foo;</EAA>\n</ZB_E>\n</DATA>')
+        parsers.CHUNK_SIZE = 10
+        ribx, log = self.assertSameAsParseData(data)
+        self.assertEqual(['bar'], [drain.ref for drain in ribx.drains])
+
+    def test_namespaced_root(self):
+        parsers.CHUNK_SIZE = 10  # So the pool is used with 2 workers
+        data = b'<DATA xmlns="urn:x">\n<ZB_E><EAA>a</EAA></ZB_E>\n</DATA>'
+        ribx, log = self.assertSameAsParseData(data)
+        self.assertEqual([], ribx.drains)
+
+    def test_cdata(self):
+        parsers.CHUNK_SIZE = 10  # So the pool is used with 2 workers
+        data = (b'<DATA>\n<ZB_E><EAA>a</EAA><X><![CDATA[</ZB_E>]]></X></ZB_E>'
+                b'\n<ZB_E><EAA>b</EAA></ZB_E>\n</DATA>')
+        ribx, log = self.assertSameAsParseData(data)
+        self.assertEqual(['a', 'b'], [drain.ref for drain in ribx.drains])
+
+    def test_utf_16(self):
+        parsers.CHUNK_SIZE = 10  # So the pool is used with 2 workers
+        data = (u'<?xml version="1.0" encoding="UTF-16"?>\n<DATA>\n'
+                u'<ZB_E><EAA>\xe9</EAA></ZB_E>\n</DATA>').encode('utf-16')
+        ribx, log = self.assertSameAsParseData(data)
+        self.assertEqual([u'\xe9'], [drain.ref for drain in ribx.drains])
+
+    def test_records_in_comments_and_deeper(self):
+        parsers.CHUNK_SIZE = 10  # So the pool is used with 2 workers
+        data = (b'<DATA>\n<!-- <ZB_E><EAA>a</EAA></ZB_E> -->\n'
+                b'<X><ZB_E><EAA>b</EAA></ZB_E></X>\n'
+                b'<ZB_E><EAA>c</EAA></ZB_E>\n</DATA>')
+        ribx, log = self.assertSameAsParseData(data)
+        self.assertEqual(['c'], [drain.ref for drain in ribx.drains])
+
+
+class TestQuickScan(unittest.TestCase):
+
+    def assertSameAsParse(self, f, mode):
+        ribx, log = parse(f, mode)
+        summary = parsers.quick_scan(f)
+        for tag, model in models.MODELS.items():
+            self.assertEqual(len(getattr(ribx, model.collection)),
+                             summary.counts[tag])
+        self.assertEqual(ribx.media, summary.media)
+        return summary
+
+    def test_ribx_13(self):
+        summary = self.assertSameAsParse(
+            os.path.join(RIBX13_DATA_DIR, "36190148 5300093.ribx"),
+            Mode.INSPECTION)
+        self.assertEqual(datetime(2016, 7, 4).date(), summary.first_date)
+        self.assertEqual(datetime(2016, 7, 4).date(), summary.last_date)
+
+    def test_ribx_12(self):
+        summary = self.assertSameAsParse(
+            os.path.join(RIBX12_DATA_DIR, "reiniging_leiding.ribx"),
+            Mode.INSPECTION)
+        self.assertEqual(datetime(2015, 4, 10).date(), summary.first_date)
+        self.assertEqual(datetime(2015, 5, 29).date(), summary.last_date)
+
+    def test_values(self):
+        data = b"""<DATA>
+            <ZB_A><ABF>2015-13-01</ABF><ABS>a&amp;b.mpg</ABS>
+              <ZC><N>video.mpg|00:01</N><M> photo.jpg </M></ZC>
+            </ZB_A>
+            <ZB_E><EBF>2014-02-03</EBF><EBS>ignored.mpg</EBS></ZB_E>
+            <ZB_C/>
+            </DATA>"""
+        summary = parsers.quick_scan(BytesIO(data))
+        self.assertEqual(1, summary.counts['ZB_A'])
+        self.assertEqual(1, summary.counts['ZB_C'])
+        self.assertEqual(0, summary.counts['ZB_G'])
+        self.assertEqual(set(['a&b.mpg', 'video.mpg', 'photo.jpg']),
+                         summary.media)
+        # The invalid date is left out.
+        self.assertEqual(datetime(2014, 2, 3).date(), summary.first_date)
+        self.assertEqual(datetime(2014, 2, 3).date(), summary.last_date)
+
+    def test_latin_1(self):
+        # The fixture declares ISO-8859-1; give it non-ASCII filenames and
+        # character references.
+        with open(os.path.join(
+                RIBX13_DATA_DIR, "36190148 5300093.ribx"), 'rb') as f:
+            data = f.read()
+        data = data.replace(b'<ABS>5300093.mpg', b'<ABS>caf\xe9.mpg', 1)
+        data = data.replace(b'<M>L6704612.jpg', b'<M>it&#39;s &#233;.jpg', 1)
+        data = data.replace(
+            b'<N>5300093.mpg|00:00:11', b'<N>&#x20;v&#233;.mpg|00:00:11', 1)
+        summary = self.assertSameAsParse(BytesIO(data), Mode.INSPECTION)
+        self.assertTrue(u'caf\xe9.mpg' in summary.media)
+        self.assertTrue(u"it's \xe9.jpg" in summary.media)
+
+    def test_no_dates(self):
+        summary = parsers.quick_scan(BytesIO(b"<DATA></DATA>"))
+        self.assertEqual(None, summary.first_date)
+        self.assertEqual(set(), summary.media)
+
+
+class TestReparse(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(
+                RIBX12_DATA_DIR, "reiniging_leiding.ribx"), 'rb') as f:
+            self.data = f.read()
+        self.previous, changes, log = parsers.reparse(
+            None, BytesIO(self.data), Mode.INSPECTION)
+
+    def summary(self, ribx):
+        return [(element.ref, element.sourceline)
+                for element in ribx.cleaning_pipes + ribx.cleaning_manholes]
+
+    def test_first_parse(self):
+        ribx, log = parse(BytesIO(self.data), Mode.INSPECTION)
+        self.assertEqual(self.summary(ribx), self.summary(self.previous))
+        self.assertEqual(ribx.media, self.previous.media)
+
+    def test_unchanged(self):
+        pipes = list(self.previous.cleaning_pipes)
+        ribx, changes, log = parsers.reparse(
+            self.previous, BytesIO(self.data), Mode.INSPECTION)
+        self.assertEqual(parsers.Changes([], [], []), changes)
+        self.assertEqual(pipes, ribx.cleaning_pipes)  # Reused
+
+    def test_changes(self):
+        # Make one pipe invalid, shift everything by two lines and remove
+        # the first cleaning manhole.
+        data = self.data.replace(
+            b'<GAA>1600027</GAA>', b'<GAA>1600027</GAA><GXD>Q</GXD>', 1)
+        data = data.replace(b'<ZA>', b'\n\n<ZA>', 1)
+        start = data.index(b'<ZB_J>')
+        data = data[:start] + data[data.index(b'</ZB_J>', start) + 7:]
+
+        ribx, changes, log = parsers.reparse(
+            self.previous, BytesIO(data), Mode.INSPECTION)
+        expected, expected_log = parse(BytesIO(data), Mode.INSPECTION)
+
+        self.assertEqual(['1600027'], changes.changed)
+        self.assertEqual(
+            [self.previous.cleaning_manholes[0].ref], changes.removed)
+        self.assertEqual([], changes.added)
+        self.assertEqual(expected_log, log)
+        self.assertEqual(self.summary(expected), self.summary(ribx))
+
+    def test_other_mode(self):
+        ribx, changes, log = parsers.reparse(
+            self.previous, BytesIO(self.data), Mode.PREINSPECTION)
+        self.assertTrue(changes.changed)
+        self.assertTrue(log)
+
+    def test_previous_is_not_changed(self):
+        data = (b'<DATA>\n<ZB_E><EAA>a</EAA></ZB_E>\n'
+                b'<ZB_E><EAA>b</EAA></ZB_E>\n</DATA>')
+        previous, changes, log = parsers.reparse(
+            None, BytesIO(data), Mode.PREINSPECTION)
+        moved = data.replace(b'<DATA>', b'<DATA>\n', 1)
+        ribx, changes, log = parsers.reparse(
+            previous, BytesIO(moved), Mode.PREINSPECTION)
+        self.assertEqual([('a', 3), ('b', 4)],
+                         [(d.ref, d.sourceline) for d in ribx.drains])
+        self.assertEqual([('a', 2), ('b', 3)],
+                         [(d.ref, d.sourceline) for d in previous.drains])
+
+    def test_pipe_manholes_are_copied(self):
+        data = self.data.replace(b'<ZA>', b'\n<ZA>', 1)
+        lines = [(pipe.sourceline, pipe.manhole1.sourceline)
+                 for pipe in self.previous.cleaning_pipes]
+        ribx, changes, log = parsers.reparse(
+            self.previous, BytesIO(data), Mode.INSPECTION)
+        self.assertEqual(lines, [(pipe.sourceline, pipe.manhole1.sourceline)
+                                 for pipe in self.previous.cleaning_pipes])
+        self.assertEqual([(a + 1, b + 1) for a, b in lines],
+                         [(pipe.sourceline, pipe.manhole1.sourceline)
+                          for pipe in ribx.cleaning_pipes])
+
+    def test_byte_scan_disagrees(self):
+        for data in [
+                b'<DATA xmlns="urn:x">\n<ZB_E><EAA>a</EAA></ZB_E>\n</DATA>',
+                b'<DATA>\n<ZB_E><EAA>a</EAA><X><![CDATA[</ZB_E>]]></X>'
+                b'</ZB_E>\n</DATA>',
+                b'<DATA>\n<!-- <ZB_E><EAA>b</EAA></ZB_E> -->\n'
+                b'<X><ZB_E><EAA>c</EAA></ZB_E></X>\n'
+                b'<ZB_E><EAA>a</EAA></ZB_E>\n</DATA>']:
+            expected, expected_log = parse(BytesIO(data), Mode.PREINSPECTION)
+            previous, changes, log = parsers.reparse(
+                None, BytesIO(data), Mode.PREINSPECTION)
+            self.assertEqual([d.ref for d in expected.drains],
+                             [d.ref for d in previous.drains])
+            self.assertEqual(expected_log, log)
+            self.assertEqual([d.ref for d in expected.drains], changes.added)
+            ribx, changes, log = parsers.reparse(
+                previous, BytesIO(data), Mode.PREINSPECTION)
+            self.assertEqual([], changes.added + changes.removed)
+            self.assertEqual([d.ref for d in expected.drains],
+                             changes.changed)
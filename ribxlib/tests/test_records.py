@@ -0,0 +1,47 @@
+import unittest
+
+from lxml import etree
+
+from ribxlib import records
+
+DOCUMENT = b"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<!-- <ZA> in a comment -->
+<DATA xmlns:gml="http://www.opengis.net/gml"
+      xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <ZA><A2>nl</A2></ZA>
+  <ZB_A>
+    <AAA>pipe</AAA>
+  </ZB_A>
+  <ZB_AX><AXA>not a record</AXA></ZB_AX>
+  <ZB_E/>
+  <ZB_C><CAA>manhole</CAA></ZB_C>
+</DATA>
+"""
+
+
+class ScanTest(unittest.TestCase):
+
+    def test_records(self):
+        found = list(records.scan(DOCUMENT))
+        self.assertEqual(['ZB_A', 'ZB_E', 'ZB_C'], [r.tag for r in found])
+        self.assertEqual([6, 10, 11], [r.line for r in found])
+        for record in found:
+            self.assertEqual(DOCUMENT[record.start:record.end], record.data)
+
+    def test_prolog(self):
+        prolog = records.prolog(DOCUMENT)
+        self.assertEqual(b'DATA', prolog.root)
+        self.assertTrue(prolog.data.startswith(b'<?xml'))
+        self.assertTrue(prolog.data.endswith(
+            b'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'))
+
+    def test_no_root(self):
+        self.assertRaises(ValueError, records.prolog, b'<?xml version="1.0"?>')
+
+    def test_wrap(self):
+        found = list(records.scan(DOCUMENT))
+        prolog = records.prolog(DOCUMENT)
+        root = etree.fromstring(records.wrap(prolog, found))
+        self.assertEqual(['ZB_A', 'ZB_E', 'ZB_C'],
+                         [node.tag for node in root])
+        self.assertEqual(prolog.data.count(b'\n') + 1, root[0].sourceline)
@@ -0,0 +1,141 @@
+from io import BytesIO
+import gzip
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from ribxlib import parsers
+from ribxlib import sources
+from ribxlib.parsers import Mode
+
+RIBX13_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13',
+    '36190148 5300093.ribx')
+
+
+class Unseekable(object):
+    """A file object that can only be read, like an upload stream."""
+
+    def __init__(self, data):
+        self._f = BytesIO(data)
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+
+def key(ribx, log):
+    return ([(e.sourceline, e.ref) for e in ribx.elements()], log)
+
+
+class SourcesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(RIBX13_FILE, 'rb') as f:
+            self.data = f.read()
+
+        self.gzip_path = os.path.join(self.directory, 'upload.gz')
+        with gzip.GzipFile(self.gzip_path, 'wb') as f:
+            f.write(self.data)
+
+        self.zip_path = os.path.join(self.directory, 'upload.zip')
+        with zipfile.ZipFile(self.zip_path, 'w') as archive:
+            archive.writestr('readme.txt', b'Not this one')
+            archive.writestr('upload.ribx', self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_compression(self):
+        with open(self.gzip_path, 'rb') as f:
+            self.assertEqual('gzip', sources.compression(f))
+        with open(self.zip_path, 'rb') as f:
+            self.assertEqual('zip', sources.compression(f))
+        with open(RIBX13_FILE, 'rb') as f:
+            self.assertEqual(None, sources.compression(f))
+            self.assertEqual(0, f.tell())
+
+    def test_open_stream(self):
+        for f in [RIBX13_FILE, self.gzip_path, self.zip_path,
+                  BytesIO(self.read(self.gzip_path)),
+                  Unseekable(self.read(self.zip_path))]:
+            with sources.open_stream(f) as stream:
+                self.assertEqual(self.data, stream.read())
+
+    def test_open_buffer_maps_plain_files(self):
+        with sources.open_buffer(RIBX13_FILE) as data:
+            self.assertTrue(isinstance(data, mmap.mmap))
+            self.assertEqual(self.data, data[:])
+
+    def test_open_buffer(self):
+        for f in [self.gzip_path, self.zip_path, BytesIO(self.data),
+                  Unseekable(self.read(self.gzip_path))]:
+            with sources.open_buffer(f) as data:
+                self.assertEqual(self.data, data)
+
+    def test_empty_file(self):
+        path = os.path.join(self.directory, 'empty.ribx')
+        open(path, 'wb').close()
+        with sources.open_buffer(path) as data:
+            self.assertEqual(b'', data)
+
+    def test_ambiguous_zip(self):
+        with zipfile.ZipFile(self.zip_path, 'a') as archive:
+            archive.writestr('other.ribx', self.data)
+        with self.assertRaises(ValueError):
+            with sources.open_stream(self.zip_path):
+                pass
+
+    def test_parsers(self):
+        expected = key(*parsers.parse(RIBX13_FILE, Mode.INSPECTION))
+        for f in [self.gzip_path, self.zip_path]:
+            self.assertEqual(expected, key(*parsers.parse(f, Mode.INSPECTION)))
+            self.assertEqual(expected, key(*parsers.parse_parallel(
+                f, Mode.INSPECTION, workers=1)))
+            ribx, changes, log = parsers.reparse(None, f, Mode.INSPECTION)
+            self.assertEqual(expected, key(ribx, log))
+            log = []
+            elements = list(parsers.iterparse(f, Mode.INSPECTION, log))
+            self.assertEqual(expected[0],
+                             [(e.sourceline, e.ref) for e in elements])
+
+    def test_text_mode(self):
+        expected = key(*parsers.parse(RIBX13_FILE, Mode.INSPECTION))
+
+        def text():
+            return io.open(RIBX13_FILE, encoding='iso-8859-1')
+
+        with text() as f:
+            self.assertEqual(None, sources.compression(f))
+        with text() as f:
+            self.assertEqual(expected, key(*parsers.parse(f, Mode.INSPECTION)))
+        with text() as f:
+            self.assertEqual(expected, key(*parsers.parse(
+                f, Mode.INSPECTION, max_errors=10)))
+        with text() as f:
+            self.assertEqual(expected, key(*parsers.parse_parallel(
+                f, Mode.INSPECTION, workers=1)))
+        with text() as f:
+            ribx, changes, log = parsers.reparse(None, f, Mode.INSPECTION)
+            self.assertEqual(expected, key(ribx, log))
+        with text() as f:
+            elements = list(parsers.iterparse(f, Mode.INSPECTION))
+            self.assertEqual(expected[0],
+                             [(e.sourceline, e.ref) for e in elements])
+        with text() as f:
+            self.assertEqual(parsers.quick_scan(RIBX13_FILE),
+                             parsers.quick_scan(f))
+
+    def test_encode(self):
+        self.assertEqual(
+            b"<?xml version='1.0' encoding='UTF-8'?><a>\xc3\xa9</a>",
+            sources.encode(
+                u"\ufeff<?xml version='1.0' encoding='latin-1'?><a>\xe9</a>"))
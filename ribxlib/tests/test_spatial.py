@@ -0,0 +1,120 @@
+import math
+import os
+import random
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ribxlib import geometry
+from ribxlib import models
+from ribxlib.parsers import Mode
+from ribxlib.parsers import parse
+
+RIBX13_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_13',
+    '36190148 5300093.ribx')
+
+
+def distance(element, x, y):
+    """Brute force distance of an element to a point."""
+    if isinstance(element, models.Pipe):
+        x1, y1 = element.manhole1.geom.GetX(), element.manhole1.geom.GetY()
+        x2, y2 = element.manhole2.geom.GetX(), element.manhole2.geom.GetY()
+    else:
+        x1 = x2 = element.geom.GetX()
+        y1 = y2 = element.geom.GetY()
+    dx, dy = x2 - x1, y2 - y1
+    length2 = dx * dx + dy * dy
+    t = 0 if not length2 else ((x - x1) * dx + (y - y1) * dy) / length2
+    t = min(max(t, 0), 1)
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class SpatialIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(15)
+        self.ribx = models.Ribx()
+        manholes = []
+        for i in range(500):
+            manhole = models.InspectionManhole('m{}'.format(i))
+            manhole.geom = geometry.point(
+                rnd.uniform(0, 1000), rnd.uniform(0, 1000))
+            manholes.append(manhole)
+        self.ribx.inspection_manholes.extend(manholes)
+        for i in range(500):
+            pipe = models.InspectionPipe('p{}'.format(i))
+            pipe.manhole1, pipe.manhole2 = rnd.sample(manholes, 2)
+            self.ribx.inspection_pipes.append(pipe)
+        drain = models.Drain('d')
+        drain.geom = geometry.point(500, 500)
+        self.ribx.drains.append(drain)
+        # Not indexed: no coordinates.
+        self.ribx.cleaning_manholes.append(models.CleaningManhole('none'))
+        self.index = self.ribx.spatial_index()
+
+    def test_len(self):
+        self.assertEqual(1001, len(self.index))
+
+    def test_bbox(self):
+        found = self.index.bbox(100, 200, 300, 400)
+        expected = []
+        for element in self.ribx.elements():
+            if isinstance(element, models.CleaningManhole):
+                continue
+            if isinstance(element, models.Pipe):
+                xs = sorted([element.manhole1.geom.GetX(),
+                             element.manhole2.geom.GetX()])
+                ys = sorted([element.manhole1.geom.GetY(),
+                             element.manhole2.geom.GetY()])
+                if xs[0] <= 300 and xs[1] >= 100 and \
+                        ys[0] <= 400 and ys[1] >= 200:
+                    expected.append(element)
+            elif 100 <= element.geom.GetX() <= 300 and \
+                    200 <= element.geom.GetY() <= 400:
+                expected.append(element)
+        self.assertEqual(set(expected), set(found))
+
+    def test_radius(self):
+        found = self.index.radius(400, 600, 50)
+        expected = [element for element in self.ribx.elements()
+                    if not isinstance(element, models.CleaningManhole) and
+                    distance(element, 400, 600) <= 50]
+        self.assertEqual(set(expected), set(found))
+        distances = [distance(element, 400, 600) for element in found]
+        self.assertEqual(sorted(distances), distances)
+
+    def test_nearest(self):
+        for x, y in [(0, 0), (500, 501), (2000, -300)]:
+            found = self.index.nearest(x, y, k=5, types=models.Manhole)
+            expected = sorted(
+                self.ribx.inspection_manholes,
+                key=lambda element: distance(element, x, y))[:5]
+            self.assertEqual(expected, found)
+
+    def test_nearest_more_than_available(self):
+        self.assertEqual(1, len(self.index.nearest(0, 0, 10, models.Drain)))
+
+    def test_invalidated(self):
+        drain = models.Drain('d2')
+        drain.geom = geometry.point(-10, -10)
+        self.ribx.drains.append(drain)
+        self.assertEqual([drain], self.ribx.spatial_index().nearest(-9, -9))
+
+    def test_empty(self):
+        index = models.Ribx().spatial_index()
+        self.assertEqual(0, len(index))
+        self.assertEqual([], index.bbox(0, 0, 1, 1))
+        self.assertEqual([], index.radius(0, 0, 1))
+        self.assertEqual([], index.nearest(0, 0))
+
+    def test_parsed(self):
+        ribx, log = parse(RIBX13_FILE, Mode.INSPECTION)
+        p0, p1 = ribx.inspection_pipes
+        x = p0.manhole1.geom.GetX()
+        y = p0.manhole1.geom.GetY()
+        self.assertEqual({p0, p1}, set(ribx.spatial_index().radius(x, y, 1)))
@@ -0,0 +1,62 @@
+from io import BytesIO
+import os
+import unittest
+
+from ribxlib import parsers
+from ribxlib.parsers import Mode
+from ribxlib.stats import ParseStats
+
+RIBX12_FILE = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'testdata', 'ribx_12',
+    'reiniging_leiding.ribx')
+
+
+class ParseStatsTest(unittest.TestCase):
+
+    def test_parse(self):
+        phases = []
+        stats = ParseStats(callback=lambda name, seconds: phases.append(name))
+        ribx, log = parsers.parse(RIBX12_FILE, Mode.INSPECTION, stats=stats)
+
+        self.assertEqual(['xml', 'elements'], phases)
+        self.assertEqual(
+            {'ZB_G': len(ribx.cleaning_pipes),
+             'ZB_J': len(ribx.cleaning_manholes)},
+            stats.elements)
+        self.assertEqual(
+            len(ribx.cleaning_pipes) + len(ribx.cleaning_manholes),
+            stats.methods['ElementParser.parse'].calls)
+        self.assertEqual(
+            stats.elements['ZB_G'] * 2,  # Two manholes per pipe
+            stats.methods['ElementParser.tag_point'].calls -
+            stats.elements['ZB_J'])
+
+    def test_errors_are_counted(self):
+        stats = ParseStats()
+        ribx, log = parsers.parse(
+            RIBX12_FILE, Mode.PREINSPECTION, stats=stats)
+        self.assertEqual(len(log), sum(stats.errors.values()))
+
+    def test_iterparse(self):
+        stats = ParseStats()
+        elements = list(parsers.iterparse(
+            RIBX12_FILE, Mode.INSPECTION, stats=stats))
+        self.assertEqual(len(elements), sum(stats.elements.values()))
+        self.assertTrue(stats.phases['xml'].seconds > 0)
+
+    def test_iterparse_syntax_error(self):
+        stats = ParseStats()
+        log = []
+        elements = list(parsers.iterparse(
+            BytesIO(b"<DATA><ZB_E><EAA>whee</EAA></ZB_E><ZB_E>"),
+            Mode.PREINSPECTION, log, stats=stats))
+        self.assertEqual(['whee'], [e.ref for e in elements])
+        self.assertEqual(1, len(log))
+        self.assertTrue('xml' in stats.phases)
+
+    def test_as_dict(self):
+        stats = ParseStats()
+        parsers.parse(RIBX12_FILE, Mode.INSPECTION, stats=stats)
+        as_dict = stats.as_dict()
+        self.assertEqual(1, as_dict['phases']['xml']['calls'])
+        self.assertTrue(as_dict['methods']['ElementParser.children']['calls'])
@@ -9,8 +9,7 @@ long_description = '\n\n'.join([
     ])
 
 install_requires = [
-    'enum34',
-    'gdal',
+    'enum34; python_version < "3.4"',
     'lxml >= 3.3.4',  # Source line numbers above 65535
     'setuptools',
     ],
@@ -36,7 +35,9 @@ setup(name='ribxlib',
       zip_safe=False,
       install_requires=install_requires,
       tests_require=tests_require,
-      extras_require={'test': tests_require},
+      extras_require={'test': tests_require,
+                      'ogr': ['gdal'],
+                      'numpy': ['numpy']},
       entry_points={
           'console_scripts': [
               'ribxdebug = ribxlib.script:main',